@@ -1,10 +1,20 @@
+import time
+
+# Время старта отсчитываем до импортов: они составляют основную часть запуска
+startup_started = time.perf_counter()
+
 import os
 import logging
 from flask import Flask
 from flask_cors import CORS
 from sbis_project.sbis_app import SBISApp
+from sbis_project.prefetch import PrefetchScheduler
+from sbis_project import sbis_config
 from logging.handlers import TimedRotatingFileHandler
 from utils.file_utils import init_employees_file, init_salary_rates_file, init_products_file, init_stocks_file
+from utils.data_store import DB_PATH, get_data_store
+from utils.product_utils import get_product_catalog
+from utils.stock_utils import StockSalesRecorder
 from routes.auth import setup_routes as setup_auth_routes
 from routes.receipts import setup_routes as setup_receipts_routes
 from routes.production import setup_routes as setup_production_routes
@@ -41,11 +51,13 @@ if not API_TOKEN:
 # Сохраняем API_TOKEN в конфигурации приложения
 app.config['API_TOKEN'] = API_TOKEN
 
-# Инициализация файлов
-init_products_file()
-init_stocks_file()
-init_employees_file()
-init_salary_rates_file()
+# Инициализация данных: начальные JSON-файлы переносятся в базу при её первом создании
+if not os.path.exists(DB_PATH):
+    init_products_file()
+    init_stocks_file()
+    init_employees_file()
+    init_salary_rates_file()
+data_store = get_data_store()
 
 # Инициализация SBISApp
 sbis_app = SBISApp(
@@ -55,17 +67,31 @@ sbis_app = SBISApp(
     inn=os.getenv("SBIS_INN", "301806206800")
 )
 
+# Справочник товаров пополняется при загрузке чеков, а не при формировании ответов:
+# позиции сохраняются уже с id товаров
+product_catalog = get_product_catalog()
+sbis_app.set_product_resolver(product_catalog.resolve)
+# Продажи из сохранённых чеков списываются с остатков
+sbis_app.add_ingest_listener(StockSalesRecorder(data_store, sbis_app.store))
+
 # Подключаем маршруты
 setup_auth_routes(app, sbis_app)
-setup_receipts_routes(app, sbis_app)
-setup_production_routes(app, sbis_app)
-setup_stocks_routes(app)
-setup_employees_routes(app)
+setup_receipts_routes(app, sbis_app, product_catalog)
+setup_production_routes(app, sbis_app, data_store, product_catalog)
+setup_stocks_routes(app, data_store)
+setup_employees_routes(app, data_store)
+
+# Фоновый прогрев кэша чеков и списка ККТ
+if sbis_config.PREFETCH_ENABLED:
+    prefetch_scheduler = PrefetchScheduler(sbis_app)
+    prefetch_scheduler.start()
 
 # Вывод зарегистрированных маршрутов
 logger.info("Зарегистрированные маршруты:")
 for rule in app.url_map.iter_rules():
     logger.info(rule)
 
+logger.info(f"Приложение инициализировано за {time.perf_counter() - startup_started:.2f} с")
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,184 +1,228 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
 from datetime import datetime, timedelta
 import logging
-import numpy as np
-from sklearn.linear_model import LinearRegression
 from utils.auth_utils import check_auth_token
-from utils.product_utils import update_products_from_data
-import os
-import json
+from utils.response_utils import json_response
+from utils.forecast_utils import forecast_series, FORECAST_METHODS, DEFAULT_FORECAST_METHOD
+from sbis_project import sbis_config, json_codec
+from sbis_project.day_cache import DayCache
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
 production_bp = Blueprint('production', __name__)
 
-def setup_routes(app, sbis_app):
+# Сколько дней можно запланировать одним запросом
+MAX_PLANNING_DAYS = 31
+
+
+def _build_plan(forecasts, stock_data, point_name):
+    """
+    Собирает план по точкам (и «Все точки», если точка не выбрана) из прогнозов на один день.
+    stock_data — остатки {точка: {ключ товара: количество}}; ключ — id товара (или название, если id нет).
+    """
+    production_plan = {}
+    aggregated_plan = {}
+    for item, forecast_demand in forecasts:
+        # Продажи сверх введённого остатка уводят его в минус: для плана это просто «нет остатка»
+        stock = max(0, stock_data.get(item['point_name'], {}).get(item['product_key'], 0))
+        to_produce = max(0, forecast_demand - stock)
+        point = item['point_name']
+        if point not in production_plan:
+            production_plan[point] = []
+        production_plan[point].append({
+            'product_id': item['product_id'],
+            'name': item['name'],
+            'demand': forecast_demand,
+            'stock': stock,
+            'to_produce': to_produce
+        })
+
+        if not point_name:
+            key = item['product_key']
+            if key not in aggregated_plan:
+                aggregated_plan[key] = {
+                    'product_id': item['product_id'],
+                    'name': item['name'],
+                    'demand': 0,
+                    'stock': 0,
+                    'to_produce': 0
+                }
+            aggregated_plan[key]['demand'] += forecast_demand
+            aggregated_plan[key]['stock'] += stock
+            aggregated_plan[key]['to_produce'] += to_produce
+
+    if not point_name:
+        production_plan['Все точки'] = list(aggregated_plan.values())
+
+    result = []
+    for point, items in production_plan.items():
+        total_to_produce = sum(item['to_produce'] for item in items)
+        result.append({
+            'point_name': point,
+            'items': items,
+            'total_to_produce': total_to_produce
+        })
+    return result
+
+
+def setup_routes(app, sbis_app, data_store, product_catalog):
+    # Готовые планы в закодированном виде (отдаются без повторного кодирования):
+    # действительны, пока не изменились ни чеки за период, ни остатки
+    plan_cache = DayCache(sbis_config.PLAN_CACHE_MAX_ENTRIES)
+
     @production_bp.route('/api/production_plan', methods=['GET'])
     def get_production_plan():
         if not check_auth_token(request, app.config['API_TOKEN']):
-            return jsonify({"error": "Неавторизованный доступ"}), 401
+            return json_response({"error": "Неавторизованный доступ"}), 401
 
         sid = request.headers.get('X-SBISSessionID')
         point_name = request.args.get('point_name')
         planning_date = request.args.get('planning_date')
+        planning_date_to = request.args.get('planning_date_to')
+        method = request.args.get('method', DEFAULT_FORECAST_METHOD)
 
         if not sid or not planning_date:
-            return jsonify({"error": "X-SBISSessionID and planning_date are required"}), 400
+            return json_response({"error": "X-SBISSessionID and planning_date are required"}), 400
+        if method not in FORECAST_METHODS:
+            return json_response({"error": f"Параметр method должен быть одним из: {', '.join(FORECAST_METHODS)}"}), 400
 
         try:
             end_date = datetime.strptime(planning_date, '%Y-%m-%d')
             start_date = end_date - timedelta(days=30)
             date_from = start_date.strftime('%Y-%m-%d')
             date_to = (end_date + timedelta(days=1)).strftime('%Y-%m-%d')
+            last_date = datetime.strptime(planning_date_to, '%Y-%m-%d') if planning_date_to else end_date
         except ValueError as e:
             logger.error(f"Ошибка парсинга даты планирования: {str(e)}")
-            return jsonify({"error": "Некорректный формат даты планирования. Используйте формат YYYY-MM-DD"}), 400
+            return json_response({"error": "Некорректный формат даты планирования. Используйте формат YYYY-MM-DD"}), 400
+
+        # Все дни диапазона планируются по одной и той же истории продаж до planning_date
+        horizon_days = (last_date - end_date).days + 1
+        if horizon_days < 1 or horizon_days > MAX_PLANNING_DAYS:
+            return json_response({"error": f"planning_date_to должна быть не раньше planning_date и не дальше {MAX_PLANNING_DAYS} дней от неё"}), 400
+        planning_dates = [end_date + timedelta(days=offset) for offset in range(horizon_days)]
+
+        plan_key = (planning_date, planning_date_to, point_name, method)
+        try:
+            receipts_version = sbis_app.receipts_version(sid, date_from, date_to, point_name)
+        except Exception as e:
+            logger.error(f"Ошибка проверки версии данных о продажах: {str(e)}")
+            receipts_version = None
+        stocks_version = data_store.version("stocks")
+        if receipts_version is not None:
+            cached_plan = plan_cache.get(plan_key, (receipts_version, stocks_version))
+            if cached_plan is not None:
+                logger.info(f"План производства на {planning_date} - {last_date.strftime('%Y-%m-%d')} взят из кэша")
+                return json_response(cached_plan)
 
         logger.info(f"Запрашиваем данные для плана производства с {date_from} по {date_to}")
 
         try:
-            receipts = sbis_app.get_receipts(sid, date_from, date_to, point_name)
-            logger.info(f"Получено чеков: {len(receipts)}")
-            update_products_from_data(receipts)
+            rollups = sbis_app.get_daily_rollup(sid, date_from, date_to, point_name)
+            logger.info(f"Получено строк итогов по дням: {len(rollups)}")
         except Exception as e:
             logger.error(f"Ошибка получения данных о продажах: {str(e)}")
-            return jsonify({"error": f"Ошибка получения данных о продажах: ${str(e)}"}), 500
+            return json_response({"error": f"Ошибка получения данных о продажах: ${str(e)}"}), 500
 
-        if not receipts:
-            logger.info("Чеки отсутствуют, возвращаем пустой план производства")
-            return jsonify({"data": []}), 200
+        if not rollups:
+            logger.info("Продажи отсутствуют, возвращаем пустой план производства")
+            response = {"data": []}
+            if planning_date_to:
+                response["plans"] = [{'planning_date': planning_day.strftime('%Y-%m-%d'), 'data': []} for planning_day in planning_dates]
+            return json_response(response), 200
 
-        # Загрузка остатков из stocks.json
+        # Остатки на начало дня планирования (на сегодня — текущие)
         try:
-            stocks_file_path = os.path.join("data", "stocks.json")
-            if os.path.exists(stocks_file_path):
-                with open(stocks_file_path, 'r', encoding='utf-8') as f:
-                    stock_data = json.load(f)
-            else:
-                stock_data = {}
-            logger.info(f"Остатки загружены из stocks.json: {stock_data}")
+            stock_at = datetime.now() if end_date.date() == datetime.now().date() else end_date
+            # Остатки ведутся по id основного товара — тем же, что назначены позициям чеков
+            stock_data = data_store.stock_quantities(stock_at.isoformat())
+            logger.info(f"Остатки загружены: {stock_data}")
         except Exception as e:
-            logger.error(f"Ошибка загрузки остатков из stocks.json: {str(e)}")
-            return jsonify({"error": f"Ошибка загрузки остатков: {str(e)}"}), 500
+            logger.error(f"Ошибка загрузки остатков: {str(e)}")
+            return json_response({"error": f"Ошибка загрузки остатков: {str(e)}"}), 500
 
         sales_by_day_of_week = {}
         try:
-            for point in receipts:
-                logger.info(f"Обрабатываем точку: {point['point_name']}, элементов: {len(point['items'])}")
-                for item in point['items']:
-                    try:
-                        date = datetime.strptime(item['receiveDateTime'].split('T')[0], '%Y-%m-%d')
-                        day_of_week = date.weekday()
-                        key = f"{day_of_week}_{item['name']}_{point['point_name']}"
-
-                        if key not in sales_by_day_of_week:
-                            sales_by_day_of_week[key] = {
-                                'day_of_week': day_of_week,
-                                'name': item['name'],
-                                'point_name': point['point_name'],
-                                'sales': []
-                            }
-
-                        first_date = start_date
-                        diff_days = (date - first_date).days
-                        week_number = diff_days // 7
-
-                        if len(sales_by_day_of_week[key]['sales']) <= week_number:
-                            sales_by_day_of_week[key]['sales'].extend([0] * (week_number + 1 - len(sales_by_day_of_week[key]['sales'])))
-                        sales_by_day_of_week[key]['sales'][week_number] += item['quantity']
-                    except KeyError as ke:
-                        logger.error(f"Ошибка обработки элемента чека: отсутствует ключ {ke}")
-                        continue
-                    except ValueError as ve:
-                        logger.error(f"Ошибка парсинга даты в чеке: {str(ve)}")
-                        continue
+            # Итоги уже сгруппированы по id товара, назначенному при загрузке чеков:
+            # варианты написания одного товара продаются как один товар
+            for row in rollups:
+                try:
+                    date = datetime.strptime(row['day'], '%Y-%m-%d')
+                    day_of_week = date.weekday()
+                    product_id = row['product_id']
+                    product_key = row['name'] if product_id is None else product_id
+                    key = (day_of_week, product_key, row['point_name'])
+
+                    if key not in sales_by_day_of_week:
+                        sales_by_day_of_week[key] = {
+                            'day_of_week': day_of_week,
+                            'product_key': product_key,
+                            'product_id': product_id,
+                            'name': (product_catalog.name(product_id) if product_id is not None else None) or row['name'],
+                            'point_name': row['point_name'],
+                            'sales': []
+                        }
+
+                    first_date = start_date
+                    diff_days = (date - first_date).days
+                    week_number = diff_days // 7
+
+                    if len(sales_by_day_of_week[key]['sales']) <= week_number:
+                        sales_by_day_of_week[key]['sales'].extend([0] * (week_number + 1 - len(sales_by_day_of_week[key]['sales'])))
+                    sales_by_day_of_week[key]['sales'][week_number] += row['quantity']
+                except KeyError as ke:
+                    logger.error(f"Ошибка обработки итогов продаж: отсутствует ключ {ke}")
+                    continue
+                except ValueError as ve:
+                    logger.error(f"Ошибка парсинга даты в итогах продаж: {str(ve)}")
+                    continue
         except Exception as e:
-            logger.error(f"Ошибка обработки чеков: {str(e)}")
-            return jsonify({"error": f"Ошибка обработки чеков: {str(e)}"}), 500
+            logger.error(f"Ошибка обработки итогов продаж: {str(e)}")
+            return json_response({"error": f"Ошибка обработки итогов продаж: {str(e)}"}), 500
 
-        forecast_by_day_of_week = {}
+        forecasts_by_date = {planning_day: [] for planning_day in planning_dates}
         try:
-            for key, item in sales_by_day_of_week.items():
-                sales = item['sales']
-                logger.info(f"Прогнозируем спрос для {key}, данные продаж: {sales}")
-
-                sales_data = [[i, qty] for i, qty in enumerate(sales)]
-                if len(sales_data) < 2:
-                    total_sales = sum(qty for _, qty in sales_data)
-                    avg_demand = round(total_sales / len(sales_data)) if sales_data else 0
-                    forecast_by_day_of_week[key] = {
-                        'day_of_week': item['day_of_week'],
-                        'name': item['name'],
-                        'point_name': item['point_name'],
-                        'forecast_demand': avg_demand
-                    }
-                    continue
-
-                X = np.array([x[0] for x in sales_data]).reshape(-1, 1)
-                y = np.array([x[1] for x in sales_data])
-                model = LinearRegression()
-                model.fit(X, y)
-                next_week = len(sales) - 1 + 1
-                forecast_demand = max(0, round(model.predict([[next_week]])[0]))
-
-                forecast_by_day_of_week[key] = {
-                    'day_of_week': item['day_of_week'],
-                    'name': item['name'],
-                    'point_name': item['point_name'],
-                    'forecast_demand': forecast_demand
-                }
+            # Все ряды на все дни диапазона прогнозируются одним векторным проходом:
+            # для каждого дня берутся ряды его дня недели, горизонт — номер недели от planning_date
+            rows = []
+            for planning_day in planning_dates:
+                horizon = 1 + (planning_day - end_date).days // 7
+                for item in sales_by_day_of_week.values():
+                    if item['day_of_week'] == planning_day.weekday() and (not point_name or item['point_name'] == point_name):
+                        rows.append((planning_day, item, horizon))
+            forecasts = forecast_series([item['sales'] for _, item, _ in rows], method, [horizon for _, _, horizon in rows])
+            for (planning_day, item, _), forecast_demand in zip(rows, forecasts):
+                forecasts_by_date[planning_day].append((item, forecast_demand))
         except Exception as e:
             logger.error(f"Ошибка прогнозирования спроса: {str(e)}")
-            return jsonify({"error": f"Ошибка прогнозирования спроса: {str(e)}"}), 500
+            return json_response({"error": f"Ошибка прогнозирования спроса: {str(e)}"}), 500
 
-        planning_day = end_date.weekday()
-        production_plan = {}
         try:
-            for key, item in forecast_by_day_of_week.items():
-                if item['day_of_week'] == planning_day and (not point_name or item['point_name'] == point_name):
-                    stock = stock_data.get(item['point_name'], {}).get(item['name'], 0)
-                    to_produce = max(0, item['forecast_demand'] - stock)
-                    point = item['point_name']
-                    if point not in production_plan:
-                        production_plan[point] = []
-                    production_plan[point].append({
-                        'name': item['name'],
-                        'demand': item['forecast_demand'],
-                        'stock': stock,
-                        'to_produce': to_produce
-                    })
-
-            if not point_name:
-                aggregated_plan = {}
-                for point, items in production_plan.items():
-                    for item in items:
-                        key = item['name']
-                        if key not in aggregated_plan:
-                            aggregated_plan[key] = {
-                                'name': item['name'],
-                                'demand': 0,
-                                'stock': 0,
-                                'to_produce': 0
-                            }
-                        aggregated_plan[key]['demand'] += item['demand']
-                        aggregated_plan[key]['stock'] += item['stock']
-                        aggregated_plan[key]['to_produce'] += item['to_produce']
-                production_plan['Все точки'] = list(aggregated_plan.values())
-
-            result = []
-            for point_name, items in production_plan.items():
-                total_to_produce = sum(item['to_produce'] for item in items)
-                result.append({
-                    'point_name': point_name,
-                    'items': items,
-                    'total_to_produce': total_to_produce
-                })
-
-            logger.info(f"План производства сформирован для {len(result)} точек")
-            return jsonify({"data": result})
+            # Остатки на первый день (stock_at) уменьшают только его производство: к следующим дням
+            # их израсходуют прогнозные продажи, которых журнал остатков не знает, поэтому
+            # остатки на начало следующих дней завысили бы наличие
+            plans = [
+                {
+                    'planning_date': planning_day.strftime('%Y-%m-%d'),
+                    'data': _build_plan(forecasts_by_date[planning_day], stock_data if index == 0 else {}, point_name)
+                }
+                for index, planning_day in enumerate(planning_dates)
+            ]
+            response = {"data": plans[0]['data']}
+            if planning_date_to:
+                response["plans"] = plans
+
+            logger.info(f"План производства сформирован на {len(plans)} дн. для {len(plans[0]['data'])} точек")
+
+            # Версия чеков берётся после загрузки: план соответствует сохранённым данным
+            receipts_version = sbis_app.receipts_version(sid, date_from, date_to, point_name)
+            body = json_codec.dumps(response)
+            if receipts_version is not None:
+                plan_cache.put(plan_key, (receipts_version, stocks_version), body)
+            return json_response(body)
         except Exception as e:
             logger.error(f"Ошибка формирования плана производства: {str(e)}")
-            return jsonify({"error": f"Ошибка формирования плана производства: {str(e)}"}), 500
+            return json_response({"error": f"Ошибка формирования плана производства: {str(e)}"}), 500
 
     app.register_blueprint(production_bp)
\ No newline at end of file
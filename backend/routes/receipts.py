@@ -1,51 +1,135 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, Response, stream_with_context
 import logging
 from utils.auth_utils import check_auth_token
-from utils.product_utils import update_products_from_data
+from utils.response_utils import json_response
+from utils.sales_utils import summarize_sales, summarize_rollups, BUCKET_PREFIX_LENGTH
+from sbis_project.line_items import points_to_json
+from sbis_project import json_codec
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
 receipts_bp = Blueprint('receipts', __name__)
 
-def setup_routes(app, sbis_app):
+# Форматы /api/receipts: один JSON-документ или поток NDJSON (строка на точку за день)
+RECEIPTS_FORMATS = ("json", "ndjson")
+
+def setup_routes(app, sbis_app, product_catalog=None):
     @receipts_bp.route('/api/kkts', methods=['GET'])
     def get_kkts():
         if not check_auth_token(request, app.config['API_TOKEN']):
-            return jsonify({"error": "Неавторизованный доступ"}), 401
+            return json_response({"error": "Неавторизованный доступ"}), 401
 
         sid = request.headers.get('X-SBISSessionID')
         if not sid:
-            return jsonify({"error": "X-SBISSessionID header is required"}), 400
+            return json_response({"error": "X-SBISSessionID header is required"}), 400
         try:
             kkts = sbis_app.get_kkts(sid)
             logger.info(f"Успешно получено {len(kkts)} KKT")
-            return jsonify({"kkts": kkts})
+            return json_response({"kkts": kkts})
         except Exception as e:
             logger.error(f"Ошибка получения списка KKT: {str(e)}")
-            return jsonify({"error": f"Ошибка получения списка KKT: {str(e)}"}), 500
+            return json_response({"error": f"Ошибка получения списка KKT: {str(e)}"}), 500
+
+    @receipts_bp.route('/api/kkts/refresh', methods=['POST'])
+    def refresh_kkts():
+        if not check_auth_token(request, app.config['API_TOKEN']):
+            return json_response({"error": "Неавторизованный доступ"}), 401
+
+        sid = request.headers.get('X-SBISSessionID')
+        if not sid:
+            return json_response({"error": "X-SBISSessionID header is required"}), 400
+        try:
+            kkts = sbis_app.refresh_kkts(sid)
+            logger.info(f"Реестр KKT обновлён по запросу: {len(kkts)} KKT")
+            return json_response({"kkts": kkts})
+        except Exception as e:
+            logger.error(f"Ошибка обновления списка KKT: {str(e)}")
+            return json_response({"error": f"Ошибка обновления списка KKT: {str(e)}"}), 500
 
     @receipts_bp.route('/api/receipts', methods=['GET'])
     def get_receipts():
         if not check_auth_token(request, app.config['API_TOKEN']):
-            return jsonify({"error": "Неавторизованный доступ"}), 401
+            return json_response({"error": "Неавторизованный доступ"}), 401
 
         sid = request.headers.get('X-SBISSessionID')
         date_from = request.args.get('date_from')
         date_to = request.args.get('date_to')
         point_name = request.args.get('point_name')
+        response_format = request.args.get('format', 'json')
         
         if not sid or not date_from or not date_to:
-            return jsonify({"error": "X-SBISSessionID, date_from, and date_to are required"}), 400
-        
+            return json_response({"error": "X-SBISSessionID, date_from, and date_to are required"}), 400
+        if response_format not in RECEIPTS_FORMATS:
+            return json_response({"error": "Параметр format должен быть 'json' или 'ndjson'"}), 400
+
+        if response_format == "ndjson":
+            # Длинные периоды отдаются по мере чтения дней из кэша: ни весь результат,
+            # ни весь ответ целиком не держатся в памяти, клиент получает первые строки сразу
+            try:
+                days = sbis_app.iter_receipts_ndjson(sid, date_from, date_to, point_name)
+            except Exception as e:
+                logger.error(f"Ошибка получения чеков: {str(e)}")
+                return json_response({"error": f"Ошибка получения чеков: {str(e)}"}), 500
+
+            def generate():
+                count = 0
+                try:
+                    for payload in days:
+                        count += 1
+                        yield payload
+                except Exception as e:
+                    # Статус уже отправлен: ошибка сообщается последней строкой потока
+                    logger.error(f"Ошибка потоковой выдачи чеков после {count} дн.: {str(e)}")
+                    yield json_codec.dumps({"error": f"Ошибка получения чеков: {str(e)}"}) + b"\n"
+                    return
+                logger.info(f"Чеки за {date_from} - {date_to} отданы потоком: {count} дн.")
+
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
         try:
             receipts = sbis_app.get_receipts(sid, date_from, date_to, point_name)
             logger.info(f"Всего обработано чеков: {len(receipts)}, агрегировано точек: {len(set(r['point_name'] for r in receipts))}")
-
-            update_products_from_data(receipts)
-            return jsonify({"data": receipts})
+            return json_response({"data": points_to_json(receipts)})
         except Exception as e:
             logger.error(f"Ошибка получения чеков: {str(e)}")
-            return jsonify({"error": f"Ошибка получения чеков: {str(e)}"}), 500
+            return json_response({"error": f"Ошибка получения чеков: {str(e)}"}), 500
+
+    @receipts_bp.route('/api/sales/summary', methods=['GET'])
+    def get_sales_summary():
+        if not check_auth_token(request, app.config['API_TOKEN']):
+            return json_response({"error": "Неавторизованный доступ"}), 401
+
+        sid = request.headers.get('X-SBISSessionID')
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+        point_name = request.args.get('point_name')
+        bucket = request.args.get('bucket')
+
+        if not sid or not date_from or not date_to:
+            return json_response({"error": "X-SBISSessionID, date_from, and date_to are required"}), 400
+        if bucket and bucket not in BUCKET_PREFIX_LENGTH:
+            return json_response({"error": "Параметр bucket должен быть 'day' или 'hour'"}), 400
+
+        try:
+            if bucket == "hour":
+                receipts = sbis_app.get_receipts(sid, date_from, date_to, point_name)
+                summary = summarize_sales(receipts, bucket, product_catalog)
+            else:
+                # Итоги по дням читаются из готовых сводок кэша, без позиций чеков
+                rollups = sbis_app.get_daily_rollup(sid, date_from, date_to, point_name)
+                summary = summarize_rollups(rollups, bucket, product_catalog)
+            logger.info(f"Сводка продаж за {date_from} - {date_to}: {len(summary['data'])} точек, {len(summary['all_points']['items'])} товаров")
+            return json_response(summary)
+        except Exception as e:
+            logger.error(f"Ошибка получения сводки продаж: {str(e)}")
+            return json_response({"error": f"Ошибка получения сводки продаж: {str(e)}"}), 500
+
+    @receipts_bp.route('/api/cache/stats', methods=['GET'])
+    def get_cache_stats():
+        if not check_auth_token(request, app.config['API_TOKEN']):
+            return json_response({"error": "Неавторизованный доступ"}), 401
+
+        return json_response(sbis_app.cache_stats())
 
     app.register_blueprint(receipts_bp)
\ No newline at end of file
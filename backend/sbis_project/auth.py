@@ -3,6 +3,7 @@ import requests
 import logging
 from sbis_project import sbis_config as config
 from sbis_project.auth_cache import save_sid, load_sid, clear_sid
+from sbis_project.client import get_default_client
 from logging.handlers import TimedRotatingFileHandler
 import os
 
@@ -22,12 +23,14 @@ logger = logging.getLogger('sbis_app')
 logger.setLevel(logging.INFO)
 logger.addHandler(handler)
 
-def get_sid_and_token():
+def get_sid_and_token(client=None):
     """
     Функция авторизуется в API СБИС, отправляя логин, пароль и client_id.
     Проверяет кэш, если SID валиден, возвращает его. Иначе запрашивает новый.
     Возвращает кортеж (sid, token) или (None, None) при ошибке.
     """
+    client = client or get_default_client()
+
     # Проверяем кэш
     sid, token = load_sid()
     if sid and token:
@@ -43,7 +46,7 @@ def get_sid_and_token():
     auth_headers = {"Content-Type": "application/json"}
 
     try:
-        response = requests.post(config.AUTH_URL, headers=auth_headers, json=auth_payload, timeout=10)
+        response = client.post(config.AUTH_URL, "auth", headers=auth_headers, json=auth_payload)
         response.raise_for_status()
         auth_data = response.json()
 
@@ -1,9 +1,9 @@
 # auth_cache.py
 import os
-import json
 from datetime import datetime, timedelta
 import logging
 from logging.handlers import TimedRotatingFileHandler
+from sbis_project.json_file import read_json, write_json_atomic
 
 # Настройка логирования
 log_dir = "logs"
@@ -30,18 +30,15 @@ def save_sid(sid, token):
         "token": token,
         "timestamp": datetime.now().isoformat()
     }
-    with open(CACHE_FILE, "w", encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False)
+    write_json_atomic(CACHE_FILE, data)
     logger.info("SID сохранен в кэш")
 
 def load_sid():
     """Загружает SID и токен из файла, проверяет срок действия (6 дней)."""
-    if not os.path.exists(CACHE_FILE):
+    data = read_json(CACHE_FILE)
+    if data is None:
         return None, None
 
-    with open(CACHE_FILE, "r", encoding='utf-8') as f:
-        data = json.load(f)
-
     timestamp = datetime.fromisoformat(data["timestamp"])
     if datetime.now() - timestamp > timedelta(days=6):
         logger.info("SID устарел, требуется обновление")
@@ -0,0 +1,73 @@
+# sbis_project/client.py
+
+import logging
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import sbis_config as config
+from .fetcher import RateLimiter
+
+logger = logging.getLogger('sbis_app')
+
+# Коды ответа, при которых запрос повторяется с экспоненциальной паузой
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class SBISClient:
+    """
+    HTTP-клиент для API СБИС с общим пулом keep-alive соединений.
+    Один экземпляр используется всеми потоками: соединения переиспользуются,
+    а запросы к каждому хосту проходят через общий ограничитель частоты.
+    """
+
+    def __init__(self, pool_size=None, max_retries=None, backoff_factor=None, timeouts=None, rate_per_host=None):
+        self.timeouts = dict(config.HTTP_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.rate_limiter = RateLimiter(config.RATE_LIMIT_PER_HOST if rate_per_host is None else rate_per_host)
+
+        retry = Retry(
+            total=config.HTTP_MAX_RETRIES if max_retries is None else max_retries,
+            backoff_factor=config.HTTP_BACKOFF_FACTOR if backoff_factor is None else backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False  # После исчерпания повторов отдаём ответ, чтобы сработал raise_for_status
+        )
+        pool_size = config.HTTP_POOL_SIZE if pool_size is None else pool_size
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def request(self, method, url, endpoint, **kwargs):
+        """Выполняет запрос с таймаутом для типа запроса endpoint ("auth", "kkts", "docs")."""
+        kwargs.setdefault("timeout", self.timeouts.get(endpoint, 10))
+        self.rate_limiter.acquire(urlparse(url).netloc)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, endpoint, **kwargs):
+        return self.request("GET", url, endpoint, **kwargs)
+
+    def post(self, url, endpoint, **kwargs):
+        return self.request("POST", url, endpoint, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """Возвращает общий клиент для вызовов без явно переданного клиента."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = SBISClient()
+        return _default_client
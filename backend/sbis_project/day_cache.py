@@ -0,0 +1,82 @@
+# sbis_project/day_cache.py
+
+import threading
+from collections import OrderedDict
+
+
+class DayCache:
+    """
+    Ограниченный по размеру LRU-кэш разобранных данных в памяти процесса.
+    Ключ — шард (день, регистрационный номер ККТ). Каждая запись помнит отметку
+    сохранения шарда (saved_at) и считается действительной, только пока отметка в хранилище
+    не изменилась. Сами отметки перечитываются из хранилища лишь при изменении
+    mtime/размера файлов базы, так что повторные запросы не обращаются к диску.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = OrderedDict()  # (day, reg_id) -> (saved_at, receipts)
+        self._lock = threading.Lock()
+        self._token = None
+        self._stamps = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def stamps(self, token, load_stamps):
+        """
+        Возвращает отметки сохранения шардов {(day, reg_id): saved_at}.
+        load_stamps вызывается, только если token (mtime/размер файлов базы) изменился.
+        """
+        with self._lock:
+            if token == self._token:
+                return self._stamps
+        stamps = load_stamps()
+        with self._lock:
+            self._token = token
+            self._stamps = stamps
+        return stamps
+
+    def get(self, key, saved_at):
+        """Возвращает чеки шарда или None, если записи нет или она устарела."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != saved_at:
+                del self._entries[key]
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, saved_at, receipts):
+        with self._lock:
+            self._entries[key] = (saved_at, receipts)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._token = None
+            self._stamps = {}
+
+    def stats(self):
+        """Счётчики для мониторинга."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,60 @@
+# sbis_project/fetcher.py
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('sbis_app')
+
+
+class RateLimiter:
+    """
+    Ограничивает частоту запросов к каждому хосту.
+    rate_per_host — допустимое число запросов в секунду (0 — без ограничения).
+    """
+
+    def __init__(self, rate_per_host):
+        self.interval = 1.0 / rate_per_host if rate_per_host and rate_per_host > 0 else 0
+        self._lock = threading.Lock()
+        self._next_slot = {}  # host -> момент, когда разрешён следующий запрос
+
+    def acquire(self, host):
+        """Блокирует поток до момента, когда к хосту можно отправить следующий запрос."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ConcurrentFetcher:
+    """
+    Выполняет независимые задачи загрузки в общем пуле потоков.
+    Частоту запросов к хосту ограничивает HTTP-клиент (см. client.SBISClient).
+    Пул общий для всех запросов к приложению, поэтому max_in_flight ограничивает
+    суммарное число одновременных обращений к API, а не число на один запрос.
+    """
+
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="sbis-fetch")
+
+    def run(self, tasks, func):
+        """
+        Запускает func(*args) для каждой задачи из tasks (список пар (key, args)).
+        Возвращает словарь key -> (result, error); порядок задач на результат не влияет.
+        """
+        futures = {key: self._executor.submit(func, *args) for key, args in tasks}
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = (future.result(), None)
+            except Exception as e:
+                results[key] = (None, e)
+        logger.info(f"Параллельно выполнено {len(results)} задач (не более {self.max_in_flight} одновременно)")
+        return results
@@ -0,0 +1,38 @@
+# sbis_project/json_codec.py
+
+import json
+import logging
+from . import sbis_config as config
+
+logger = logging.getLogger('sbis_app')
+
+# Кодек JSON для файлов данных и HTTP-ответов: orjson (если установлен) или стандартный json.
+# SBIS_JSON_CODEC=auto|orjson|json; оба кодека пишут UTF-8 без \u-экранирования и лишних пробелов.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if config.JSON_CODEC == "orjson" and orjson is None:
+    logger.warning("SBIS_JSON_CODEC=orjson, но orjson не установлен: используется стандартный json")
+
+if orjson is not None and config.JSON_CODEC in ("auto", "orjson"):
+    CODEC_NAME = "orjson"
+
+    def dumps(data):
+        """Кодирует data в JSON (bytes)."""
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(data):
+        """Разбирает JSON из bytes или str."""
+        return orjson.loads(data)
+else:
+    CODEC_NAME = "json"
+
+    def dumps(data):
+        """Кодирует data в JSON (bytes)."""
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(data):
+        """Разбирает JSON из bytes или str."""
+        return json.loads(data)
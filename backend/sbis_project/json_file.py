@@ -0,0 +1,46 @@
+# sbis_project/json_file.py
+
+import os
+import tempfile
+from filelock import FileLock
+from . import json_codec
+
+
+def read_json(path, default=None):
+    """Читает JSON-файл; default, если файла нет."""
+    if not os.path.exists(path):
+        return default
+    with open(path, 'rb') as f:
+        return json_codec.loads(f.read())
+
+
+def write_json_atomic(path, data):
+    """
+    Записывает JSON во временный файл рядом с path и заменяет им path (os.replace).
+    Читатели видят либо старое, либо новое содержимое целиком, но не наполовину записанный файл.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(json_codec.dumps(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def locked_json_update(path, fn, default=None):
+    """
+    Атомарное чтение-изменение-запись JSON-файла: под межпроцессной блокировкой path.lock
+    читает файл (default, если его нет), вызывает fn(data) и записывает результат.
+    Чтение выполняется внутри блокировки, поэтому одновременные обновления не теряются.
+    Возвращает записанные данные.
+    """
+    with FileLock(path + ".lock"):
+        data = fn(read_json(path, default))
+        write_json_atomic(path, data)
+        return data
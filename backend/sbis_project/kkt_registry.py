@@ -0,0 +1,97 @@
+# sbis_project/kkt_registry.py
+
+import logging
+import threading
+import time
+from .json_file import read_json, write_json_atomic
+
+logger = logging.getLogger('sbis_app')
+
+
+class KKTRegistry:
+    """
+    Реестр кассовых аппаратов с TTL-кэшем и индексами по regId и по названию точки.
+    Список запрашивается у API не чаще раза в ttl_seconds; при ошибке обновления
+    продолжает отдаваться последний успешно полученный список (в том числе сохранённый
+    в cache_file до перезапуска), поэтому полностью закэшированные запросы
+    обслуживаются без обращения к сети.
+    """
+
+    def __init__(self, loader, ttl_seconds, cache_file=None):
+        self.loader = loader  # loader(sid) -> список ККТ или пустой список при ошибке
+        self.ttl = ttl_seconds
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._kkts = []
+        self._by_reg_id = {}
+        self._by_point = {}
+        self._loaded_at = None
+        self._load_file()
+
+    def _load_file(self):
+        """Загружает последний сохранённый список ККТ; он считается устаревшим до первого обновления."""
+        if not self.cache_file:
+            return
+        try:
+            kkts = read_json(self.cache_file)
+            if kkts is None:
+                return
+            self._set(kkts)
+            self._loaded_at = None
+        except Exception as e:
+            logger.error(f"Ошибка загрузки сохранённого списка ККТ: {str(e)}")
+
+    def _save_file(self, kkts):
+        if not self.cache_file:
+            return
+        try:
+            # Несколько процессов могут обновлять реестр одновременно: файл заменяется целиком
+            write_json_atomic(self.cache_file, kkts)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения списка ККТ: {str(e)}")
+
+    def _set(self, kkts):
+        by_point = {}
+        for kkt in kkts:
+            by_point.setdefault(kkt.get("pointName"), []).append(kkt)
+        with self._lock:
+            self._kkts = list(kkts)
+            self._by_reg_id = {kkt.get("regId"): kkt for kkt in kkts}
+            self._by_point = by_point
+            self._loaded_at = time.monotonic()
+
+    def is_fresh(self):
+        with self._lock:
+            return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def refresh(self, sid):
+        """Принудительно перезагружает список ККТ. Возвращает новый список или текущий, если API ничего не вернул."""
+        kkts = self.loader(sid)
+        if kkts:
+            self._set(kkts)
+            self._save_file(kkts)
+            logger.info(f"Реестр ККТ обновлён: {len(kkts)} шт.")
+        elif self._kkts:
+            # Следующая попытка — через TTL, чтобы не ходить в сеть на каждом запросе во время сбоя
+            with self._lock:
+                self._loaded_at = time.monotonic()
+            logger.warning("Не удалось обновить реестр ККТ, используется последний известный список")
+        return self.all()
+
+    def get(self, sid):
+        """Возвращает список ККТ, перезагружая его только по истечении TTL."""
+        if not self.is_fresh():
+            return self.refresh(sid)
+        return self.all()
+
+    def all(self):
+        with self._lock:
+            return list(self._kkts)
+
+    def by_reg_id(self, reg_id):
+        with self._lock:
+            return self._by_reg_id.get(reg_id)
+
+    def by_point(self, point_name):
+        with self._lock:
+            return list(self._by_point.get(point_name, []))
@@ -2,6 +2,8 @@
 import requests
 import logging
 from . import sbis_config as config
+from .client import get_default_client
+from .line_items import LineItem
 from logging.handlers import TimedRotatingFileHandler
 import os
 
@@ -36,18 +38,19 @@ def get_point_name(address):
         logger.error(f"Ошибка при извлечении названия точки из адреса {address}: {str(e)}")
         return "Неизвестная точка"
 
-def get_kkts_list(sid):
+def get_kkts_list(sid, client=None):
     """
     Получает список кассовых аппаратов (ККТ) по заданному ИНН.
     Возвращает только нужные поля: regId, fsNumber, pointName, address, kktSalesPoint, status.
     """
-    org_url = f"https://api.sbis.ru/ofd/v1/orgs/{config.INN}/kkts?status=2"
+    client = client or get_default_client()
+    org_url = f"{config.API_BASE_URL}/ofd/v1/orgs/{config.INN}/kkts?status=2"
     headers = {
         "Content-Type": "application/json",
         "X-SBISSessionID": sid
     }
     try:
-        response = requests.get(org_url, headers=headers, timeout=10)
+        response = client.get(org_url, "kkts", headers=headers)
         response.raise_for_status()
         data = response.json()
         filtered_data = []
@@ -75,42 +78,62 @@ def get_kkts_list(sid):
         logger.error(f"Ошибка при получении данных о KKT: {str(e)}", exc_info=True)
         return []
 
-def get_cash_report(sid, reg_id, storage_id, date_from, date_to):
+def get_document_number(document):
+    """Возвращает номер фискального документа (ФД) для чека или смены, если он есть."""
+    for key in ("receipt", "openShift", "closeShift"):
+        if key in document:
+            number = document[key].get("fiscalDocumentNumber")
+            return int(number) if number is not None else None
+    return None
+
+def iter_cash_report_pages(sid, reg_id, storage_id, date_from, date_to, client=None, page_size=None, start_number=None):
     """
-    Получает отчеты о продажах для KKT за указанный период.
+    Постранично получает документы KKT за указанный период.
+    Каждая следующая страница запрашивается от номера ФД, следующего за последним полученным,
+    пока API не вернёт неполную страницу. start_number — номер ФД, с которого начать
+    (для дозагрузки только новых документов). Ошибки запросов пробрасываются вызывающему коду.
     """
-    url = f"https://api.sbis.ru/ofd/v1/orgs/{config.INN}/kkts/{reg_id}/storages/{storage_id}/docs"
+    client = client or get_default_client()
+    page_size = page_size or config.DOCS_PAGE_SIZE
+    url = f"{config.API_BASE_URL}/ofd/v1/orgs/{config.INN}/kkts/{reg_id}/storages/{storage_id}/docs"
     headers = {
         "Content-Type": "application/json",
         "X-SBISSessionID": sid
     }
-    params = {
-        "dateFrom": date_from,
-        "dateTo": date_to,
-        "limit": 200
-    }
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        logger.info(f"Запрос отчета для ККТ {reg_id} (ФН: {storage_id}) с {date_from} по {date_to}")
+    cursor = start_number
+    page_number = 0
+    while True:
+        params = {
+            "dateFrom": date_from,
+            "dateTo": date_to,
+            "limit": page_size
+        }
+        if cursor is not None:
+            params[config.DOCS_CURSOR_PARAM] = cursor
+
+        response = client.get(url, "docs", headers=headers, params=params)
+        page_number += 1
+        logger.info(f"Запрос отчета для ККТ {reg_id} (ФН: {storage_id}) с {date_from} по {date_to}, страница {page_number}")
         response.raise_for_status()
-        data = response.json()
-        if data:
-            logger.info(f"Данные получены! Количество записей: {len(data)}")
-            return data
-        else:
-            logger.warning(f"Нет данных по ККТ {reg_id} за указанный период")
-            return None
-    except requests.exceptions.Timeout:
-        logger.error(f"Таймаут при запросе отчета для ККТ {reg_id}")
-        return None
-    except requests.exceptions.HTTPError as e:
-        logger.error(f"HTTP ошибка при получении отчета для ККТ {reg_id}: {e.response.status_code} - {e.response.text}")
-        if e.response.status_code in [401, 403, 404, 500]:
-            raise  # Поднимаем исключение для обновления SID
-        return None
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка при получении отчета для ККТ {reg_id}: {str(e)}", exc_info=True)
-        return None
+        page = response.json() or []
+        raw_size = len(page)
+
+        if cursor is not None:
+            # Отбрасываем уже полученные документы, если API вернул их повторно
+            page = [doc for doc in page if (get_document_number(doc) or 0) >= cursor]
+            if raw_size and not page:
+                logger.warning(f"API вернул повторную страницу для ККТ {reg_id}: проверьте SBIS_DOCS_CURSOR_PARAM")
+        if not page:
+            return
+        yield page
+
+        if raw_size < page_size:
+            return
+        numbers = [n for n in (get_document_number(doc) for doc in page) if n is not None]
+        if not numbers:
+            logger.warning(f"Не удалось определить номер ФД для следующей страницы ККТ {reg_id}, загрузка остановлена")
+            return
+        cursor = max(numbers) + 1
 
 def process_receipt(receipt_data):
     """
@@ -137,12 +160,7 @@ def process_receipt(receipt_data):
                 logger.warning(f"Чек без товаров: {receipt}")
                 return None
             processed_items = [
-                {
-                    "name": item.get("name", "Неизвестный товар"),
-                    "quantity": item.get("quantity", 0),
-                    "price": item.get("price", 0),
-                    "sum": item.get("sum", 0)
-                }
+                LineItem(item.get("name", "Неизвестный товар"), item.get("quantity", 0), item.get("price", 0), item.get("sum", 0))
                 for item in items
             ]
             return {
@@ -0,0 +1,62 @@
+# sbis_project/line_items.py
+
+# Позиции чеков хранятся объектами со __slots__, а не словарями: за квартал по всем точкам
+# их сотни тысяч, и объект со слотами в несколько раз меньше словаря с теми же полями.
+# В словари они превращаются только при отдаче ответа (to_dict / points_to_json).
+
+
+class LineItem:
+    """
+    Позиция обработанного чека (формат process_receipt).
+    product_id — id товара в справочнике; назначается при загрузке (SBISApp.set_product_resolver).
+    """
+
+    __slots__ = ("name", "quantity", "price", "sum", "product_id")
+
+    def __init__(self, name, quantity=0, price=0, sum=0, product_id=None):
+        self.name = name
+        self.quantity = quantity
+        self.price = price
+        self.sum = sum
+        self.product_id = product_id
+
+    def to_dict(self):
+        return {"name": self.name, "quantity": self.quantity, "price": self.price, "sum": self.sum, "product_id": self.product_id}
+
+    def __repr__(self):
+        return f"LineItem({self.name!r}, {self.quantity!r}, {self.price!r}, {self.sum!r}, {self.product_id!r})"
+
+
+class SaleLine:
+    """Позиция в результате SBISApp.get_receipts: товар, количество, сумма и время чека."""
+
+    __slots__ = ("name", "quantity", "total_sum", "receive_dt", "product_id")
+
+    def __init__(self, name, quantity, total_sum, receive_dt, product_id=None):
+        self.name = name
+        self.quantity = quantity
+        self.total_sum = total_sum
+        self.receive_dt = receive_dt
+        self.product_id = product_id
+
+    def to_dict(self):
+        return {
+            "product_id": self.product_id,
+            "name": self.name,
+            "quantity": self.quantity,
+            "total_sum": self.total_sum,
+            "receiveDateTime": self.receive_dt
+        }
+
+    def __repr__(self):
+        return f"SaleLine({self.name!r}, {self.quantity!r}, {self.total_sum!r}, {self.receive_dt!r}, {self.product_id!r})"
+
+
+def point_to_json(point):
+    """Переводит итог точки (элемент результата SBISApp.get_receipts) в JSON-совместимый словарь."""
+    return dict(point, items=[item.to_dict() for item in point["items"]])
+
+
+def points_to_json(points):
+    """Переводит результат SBISApp.get_receipts в JSON-совместимые словари."""
+    return [point_to_json(point) for point in points]
@@ -0,0 +1,72 @@
+# sbis_project/prefetch.py
+
+import logging
+import random
+import threading
+from datetime import datetime, timedelta
+from . import sbis_config as config
+
+logger = logging.getLogger('sbis_app')
+
+
+class PrefetchScheduler:
+    """
+    Фоновый прогрев кэша: после старта и затем каждые interval_minutes обновляет список ККТ
+    и загружает чеки за скользящее окно (последние window_days дней плюс сегодня).
+    Окно обрабатывается кусками по chunk_days дней последовательно, поэтому прогрев
+    занимает не больше одного куска задач в общем пуле загрузки и не вытесняет запросы
+    пользователей. Случайная задержка (jitter) разносит прогрев разных процессов по времени.
+    """
+
+    def __init__(self, sbis_app, interval_minutes=None, window_days=None, chunk_days=None,
+                 jitter_seconds=None, startup_delay_seconds=None):
+        self.sbis_app = sbis_app
+        self.interval = (config.PREFETCH_INTERVAL_MINUTES if interval_minutes is None else interval_minutes) * 60
+        self.window_days = config.PREFETCH_WINDOW_DAYS if window_days is None else window_days
+        self.chunk_days = max(1, config.PREFETCH_CHUNK_DAYS if chunk_days is None else chunk_days)
+        self.jitter = config.PREFETCH_JITTER_SECONDS if jitter_seconds is None else jitter_seconds
+        self.startup_delay = config.PREFETCH_STARTUP_DELAY_SECONDS if startup_delay_seconds is None else startup_delay_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sbis-prefetch", daemon=True)
+        self._thread.start()
+        logger.info(f"Фоновый прогрев кэша запущен: окно {self.window_days} дн., интервал {self.interval // 60} мин.")
+
+    def stop(self):
+        self._stop.set()
+
+    def _sleep(self, seconds):
+        """Ждёт seconds (с учётом jitter); возвращает True, если планировщик остановлен."""
+        return self._stop.wait(max(0, seconds + random.uniform(0, self.jitter)))
+
+    def _run(self):
+        if self._sleep(self.startup_delay):
+            return
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Ошибка фонового прогрева кэша: {str(e)}")
+            if self._sleep(self.interval):
+                return
+
+    def run_once(self):
+        """Один цикл прогрева: ККТ, затем чеки за окно от новых дней к старым."""
+        started = datetime.now()
+        sid = self.sbis_app.auth()
+        self.sbis_app.refresh_kkts(sid)
+
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        chunk_end = today + timedelta(days=1)
+        window_start = today - timedelta(days=self.window_days)
+        while chunk_end > window_start and not self._stop.is_set():
+            chunk_start = max(window_start, chunk_end - timedelta(days=self.chunk_days))
+            self.sbis_app.get_receipts(sid, chunk_start.strftime('%Y-%m-%d'), chunk_end.strftime('%Y-%m-%d'))
+            chunk_end = chunk_start
+
+        logger.info(f"Прогрев кэша завершён за {(datetime.now() - started).total_seconds():.1f} с")
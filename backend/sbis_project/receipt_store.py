@@ -0,0 +1,265 @@
+# sbis_project/receipt_store.py
+
+import logging
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from datetime import datetime
+from .line_items import LineItem
+
+logger = logging.getLogger('sbis_app')
+
+# Версия схемы кэша; при несовпадении таблицы пересоздаются (это кэш, данные загрузятся заново)
+SCHEMA_VERSION = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    day TEXT NOT NULL,
+    reg_id TEXT NOT NULL,
+    point_name TEXT NOT NULL,
+    saved_at TEXT NOT NULL,
+    receipt_count INTEGER NOT NULL DEFAULT 0,
+    last_doc_number INTEGER,
+    last_receive_dt TEXT,
+    PRIMARY KEY (day, reg_id)
+);
+CREATE TABLE IF NOT EXISTS receipts (
+    id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL,
+    reg_id TEXT NOT NULL,
+    point_name TEXT NOT NULL,
+    retail_place TEXT,
+    receive_dt TEXT,
+    total_sum INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_receipts_day_kkt ON receipts (day, reg_id);
+CREATE TABLE IF NOT EXISTS items (
+    receipt_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    reg_id TEXT NOT NULL,
+    point_name TEXT NOT NULL,
+    product TEXT NOT NULL,
+    product_id INTEGER,
+    quantity NUMERIC NOT NULL DEFAULT 0,
+    price INTEGER NOT NULL DEFAULT 0,
+    total_sum INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_items_day_point_product ON items (day, point_name, product);
+CREATE INDEX IF NOT EXISTS idx_items_day_kkt ON items (day, reg_id);
+CREATE INDEX IF NOT EXISTS idx_items_receipt ON items (receipt_id);
+CREATE TABLE IF NOT EXISTS rollups (
+    day TEXT NOT NULL,
+    reg_id TEXT NOT NULL,
+    point_name TEXT NOT NULL,
+    product TEXT NOT NULL,
+    product_id INTEGER,
+    quantity NUMERIC NOT NULL DEFAULT 0,
+    total_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, reg_id, product)
+);
+CREATE INDEX IF NOT EXISTS idx_rollups_day_point_product ON rollups (day, point_name, product);
+"""
+
+# Пересчёт итогов шарда по товарам из его позиций: варианты названия одного товара
+# (один product_id) сворачиваются в одну строку; позиции без id — по названию
+ROLLUP_SQL = """
+INSERT INTO rollups (day, reg_id, point_name, product, product_id, quantity, total_sum)
+SELECT day, reg_id, point_name, MIN(product), product_id, SUM(quantity), SUM(total_sum)
+FROM items WHERE day = ? AND reg_id = ?
+GROUP BY day, reg_id, point_name, COALESCE(product_id, product)
+"""
+
+# Запись манифеста: когда шард сохранён и до какого документа он загружен
+ShardInfo = namedtuple("ShardInfo", ["saved_at", "last_doc_number", "last_receive_dt"])
+
+# Таблицы кэша, которые удаляются при смене версии схемы
+CACHE_TABLES = ("days", "shards", "receipts", "items", "rollups")
+
+
+class ReceiptStore:
+    """
+    Хранилище обработанных чеков в SQLite.
+    Данные разбиты на шарды (день, регистрационный номер ККТ). Таблица shards — манифест:
+    в ней отмечены загруженные шарды, поэтому запрос по одной точке дозагружает только
+    свои недостающие шарды, а запрос по всем точкам переиспользует уже загруженные.
+    Чеки и их позиции лежат в индексированных таблицах, и выборка за любой диапазон
+    дней — один индексный проход. При каждой записи шарда пересчитываются его итоги
+    по товарам (таблица rollups), так что аналитика читает O(дни x товары) строк,
+    а не все позиции чеков.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connect()
+        with conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                # Версии до 5 не хранят id товаров: чеки загрузятся заново уже с ними
+                logger.info(f"Схема кэша чеков устарела, пересоздаём таблицы (версия {SCHEMA_VERSION})")
+                for table in CACHE_TABLES:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.executescript(SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _connect(self):
+        """Возвращает соединение текущего потока (sqlite3 не разделяет соединения между потоками)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def file_token(self):
+        """
+        Возвращает отпечаток (mtime, размер) файлов базы и WAL-журнала.
+        Любая запись в базу из любого процесса меняет отпечаток.
+        """
+        token = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                stat = os.stat(path)
+                token.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                token.append(None)
+        return tuple(token)
+
+    def shard_stamps(self):
+        """Возвращает манифест {(day, reg_id): ShardInfo} для всех сохранённых шардов."""
+        rows = self._connect().execute(
+            "SELECT day, reg_id, saved_at, last_doc_number, last_receive_dt FROM shards"
+        ).fetchall()
+        return {(row[0], row[1]): ShardInfo(*row[2:]) for row in rows}
+
+    def _insert_receipts(self, conn, day, reg_id, point_name, receipts):
+        for receipt in receipts:
+            cursor = conn.execute(
+                "INSERT INTO receipts (day, reg_id, point_name, retail_place, receive_dt, total_sum) VALUES (?, ?, ?, ?, ?, ?)",
+                (day, reg_id, point_name, receipt.get("retailPlace"), receipt.get("receiveDateTime", ""), receipt.get("totalSum", 0))
+            )
+            conn.executemany(
+                "INSERT INTO items (receipt_id, day, reg_id, point_name, product, quantity, price, total_sum, product_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (cursor.lastrowid, day, reg_id, point_name, item.name, item.quantity, item.price, item.sum, item.product_id)
+                    for item in receipt.get("items", [])
+                ]
+            )
+
+    def _rebuild_rollup(self, conn, day, reg_id):
+        conn.execute("DELETE FROM rollups WHERE day = ? AND reg_id = ?", (day, reg_id))
+        conn.execute(ROLLUP_SQL, (day, reg_id))
+
+    def save_shard(self, day, reg_id, point_name, receipts, last_doc_number=None, last_receive_dt=None):
+        """Атомарно заменяет данные шарда (день, ККТ) списком обработанных чеков."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM items WHERE day = ? AND reg_id = ?", (day, reg_id))
+            conn.execute("DELETE FROM receipts WHERE day = ? AND reg_id = ?", (day, reg_id))
+            self._insert_receipts(conn, day, reg_id, point_name, receipts)
+            self._rebuild_rollup(conn, day, reg_id)
+            conn.execute(
+                "INSERT OR REPLACE INTO shards (day, reg_id, point_name, saved_at, receipt_count, last_doc_number, last_receive_dt) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (day, reg_id, point_name, datetime.now().isoformat(), len(receipts), last_doc_number, last_receive_dt)
+            )
+
+    def append_shard(self, day, reg_id, point_name, receipts, last_doc_number=None, last_receive_dt=None):
+        """
+        Дописывает в шард новые чеки, полученные после last_doc_number предыдущей загрузки,
+        и обновляет отметку сохранения. Отметка обновляется, даже если новых чеков нет.
+        """
+        conn = self._connect()
+        with conn:
+            self._insert_receipts(conn, day, reg_id, point_name, receipts)
+            if receipts:
+                self._rebuild_rollup(conn, day, reg_id)
+            conn.execute(
+                "UPDATE shards SET saved_at = ?, receipt_count = receipt_count + ?, "
+                "last_doc_number = COALESCE(?, last_doc_number), last_receive_dt = COALESCE(?, last_receive_dt) "
+                "WHERE day = ? AND reg_id = ?",
+                (datetime.now().isoformat(), len(receipts), last_doc_number, last_receive_dt, day, reg_id)
+            )
+
+    def load_shards(self, date_from, date_to, reg_ids):
+        """
+        Загружает чеки ККТ reg_ids за диапазон дней [date_from, date_to] одним запросом к каждой таблице.
+        Возвращает словарь (day, reg_id) -> список чеков в формате process_receipt (с полем point_name).
+        """
+        if not reg_ids:
+            return {}
+        conn = self._connect()
+        placeholders = ", ".join("?" for _ in reg_ids)
+        params = [date_from, date_to, *reg_ids]
+
+        items_by_receipt = {}
+        item_sql = (
+            "SELECT receipt_id, product, quantity, price, total_sum, product_id FROM items "
+            f"WHERE day BETWEEN ? AND ? AND reg_id IN ({placeholders}) ORDER BY receipt_id, rowid"
+        )
+        for receipt_id, *item in conn.execute(item_sql, params):
+            items_by_receipt.setdefault(receipt_id, []).append(LineItem(*item))
+
+        result = {}
+        receipt_sql = (
+            "SELECT id, day, reg_id, point_name, retail_place, receive_dt, total_sum FROM receipts "
+            f"WHERE day BETWEEN ? AND ? AND reg_id IN ({placeholders}) ORDER BY id"
+        )
+        for receipt_id, day, reg_id, point, retail_place, receive_dt, total_sum in conn.execute(receipt_sql, params):
+            result.setdefault((day, reg_id), []).append({
+                "retailPlace": retail_place,
+                "items": items_by_receipt.get(receipt_id, []),
+                "totalSum": total_sum,
+                "receiveDateTime": receive_dt,
+                "point_name": point
+            })
+        return result
+
+    def load_rollups(self, date_from, date_to, reg_ids):
+        """
+        Возвращает итоги по (день, точка, товар) для ККТ reg_ids за диапазон [date_from, date_to]:
+        список словарей {day, point_name, product_id, name, quantity, total_sum}, упорядоченный
+        по дню, точке и названию. Товар определяется по product_id (name — одно из его названий
+        в чеках), для позиций без id — по названию.
+        """
+        if not reg_ids:
+            return []
+        placeholders = ", ".join("?" for _ in reg_ids)
+        rows = self._connect().execute(
+            "SELECT day, point_name, product_id, MIN(product) AS name, SUM(quantity), SUM(total_sum) FROM rollups "
+            f"WHERE day BETWEEN ? AND ? AND reg_id IN ({placeholders}) "
+            "GROUP BY day, point_name, COALESCE(product_id, product) ORDER BY day, point_name, name",
+            [date_from, date_to, *reg_ids]
+        ).fetchall()
+        return [
+            {"day": day, "point_name": point, "product_id": product_id, "name": name, "quantity": quantity, "total_sum": total_sum}
+            for day, point, product_id, name, quantity, total_sum in rows
+        ]
+
+    def sales_by_time(self, day, reg_id):
+        """
+        Возвращает продажи шарда (day, reg_id) по времени чеков: список (время чека, product_id,
+        название, количество) по товарам, упорядоченный по времени. Чеки без даты пропускаются.
+        """
+        return self._connect().execute(
+            "SELECT r.receive_dt, i.product_id, MIN(i.product), SUM(i.quantity) "
+            "FROM items i JOIN receipts r ON r.id = i.receipt_id "
+            "WHERE i.day = ? AND i.reg_id = ? AND r.receive_dt GLOB '[0-9]*' "
+            "GROUP BY r.receive_dt, COALESCE(i.product_id, i.product) ORDER BY r.receive_dt",
+            (day, reg_id)
+        ).fetchall()
+
+    def delete_older_than(self, cutoff_day):
+        """Удаляет данные за дни раньше cutoff_day (YYYY-MM-DD). Возвращает число удалённых шардов."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM items WHERE day < ?", (cutoff_day,))
+            conn.execute("DELETE FROM receipts WHERE day < ?", (cutoff_day,))
+            conn.execute("DELETE FROM rollups WHERE day < ?", (cutoff_day,))
+            deleted = conn.execute("DELETE FROM shards WHERE day < ?", (cutoff_day,)).rowcount
+        if deleted:
+            logger.info(f"Удалено {deleted} устаревших шардов из кэша чеков")
+        return deleted
@@ -1,11 +1,21 @@
 # sbis_project/sbis_app.py
 
 import logging
-import json
 import os
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from . import sbis_config as config
 from .auth import get_sid_and_token
-from .kkts import get_kkts_list, get_cash_report, process_receipt
+from .kkts import get_kkts_list, iter_cash_report_pages, get_document_number, process_receipt
+from .client import SBISClient
+from .fetcher import ConcurrentFetcher
+from .receipt_store import ReceiptStore
+from .day_cache import DayCache
+from .kkt_registry import KKTRegistry
+from .single_flight import SingleFlight
+from .line_items import LineItem, SaleLine, point_to_json
+from . import json_codec
 from logging.handlers import TimedRotatingFileHandler
 
 # Настройка логирования
@@ -32,33 +42,59 @@ TEST_KKTS = [
     {"regId": "0008260147049848", "fsNumber": "7380440700545271", "pointName": "Пекарня на Ташкентская"}
 ]
 
+# Тестовые чеки в формате process_receipt (по одному на точку)
 TEST_RECEIPTS = [
     {
         "point_name": "Пекарня на Победы",
-        "items": [
-            {"name": "Пирожок с мясом", "quantity": 50, "total_sum": 2500, "receiveDateTime": "2025-03-01T10:00:00"},
-            {"name": "Пицца пепперони", "quantity": 30, "total_sum": 3000, "receiveDateTime": "2025-03-01T10:00:00"}
-        ],
-        "total_sum": 5500
+        "items": [LineItem("Пирожок с мясом", 50, 50, 2500), LineItem("Пицца пепперони", 30, 100, 3000)],
+        "totalSum": 5500,
+        "receiveDateTime": "2025-03-01T10:00:00"
     },
     {
         "point_name": "Пекарня на Бакинская",
-        "items": [
-            {"name": "Пирожок с мясом", "quantity": 40, "total_sum": 2000, "receiveDateTime": "2025-03-01T10:00:00"},
-            {"name": "треугольник с курицей", "quantity": 20, "total_sum": 1500, "receiveDateTime": "2025-03-01T10:00:00"}
-        ],
-        "total_sum": 3500
+        "items": [LineItem("Пирожок с мясом", 40, 50, 2000), LineItem("треугольник с курицей", 20, 75, 1500)],
+        "totalSum": 3500,
+        "receiveDateTime": "2025-03-01T10:00:00"
     },
     {
         "point_name": "Пекарня на Ташкентская",
-        "items": [
-            {"name": "Пирожок с капустой (печеный)", "quantity": 60, "total_sum": 1800, "receiveDateTime": "2025-03-01T10:00:00"},
-            {"name": "сосиска в тесте", "quantity": 25, "total_sum": 1250, "receiveDateTime": "2025-03-01T10:00:00"}
-        ],
-        "total_sum": 3050
+        "items": [LineItem("Пирожок с капустой (печеный)", 60, 30, 1800), LineItem("сосиска в тесте", 25, 50, 1250)],
+        "totalSum": 3050,
+        "receiveDateTime": "2025-03-01T10:00:00"
     }
 ]
 
+
+def _test_receipts(point_name):
+    """Копии тестовых чеков точки: позициям копий можно назначать id, не меняя общие TEST_RECEIPTS."""
+    return [
+        dict(receipt, items=[LineItem(item.name, item.quantity, item.price, item.sum) for item in receipt["items"]])
+        for receipt in TEST_RECEIPTS if receipt["point_name"] == point_name
+    ]
+
+
+def aggregate_receipts(receipts):
+    """
+    Группирует чеки (формат process_receipt с полем point_name) по точкам:
+    [{point_name, items: [SaleLine], total_sum}]. Позиции в JSON — points_to_json.
+    """
+    aggregated = {}
+    for receipt in receipts:
+        point = receipt.get("point_name", "Неизвестная точка")
+        if point not in aggregated:
+            aggregated[point] = {
+                "point_name": point,
+                "items": [],
+                "total_sum": 0
+            }
+        receive_dt = receipt.get("receiveDateTime", "")
+        aggregated[point]["items"].extend(
+            SaleLine(item.name, item.quantity, item.sum, receive_dt, item.product_id) for item in receipt.get("items", [])
+        )
+        aggregated[point]["total_sum"] += receipt.get("totalSum", 0)
+    return list(aggregated.values())
+
+
 class SBISApp:
     def __init__(self, client_id, login, password, inn):
         self.client_id = client_id
@@ -67,51 +103,152 @@ class SBISApp:
         self.inn = inn
         self.sid = None
         self.token = None
-        self.cache_dir = os.path.join("cache", "receipts")  # Папка для хранения кэша
+        self.cache_dir = "cache"  # Папка для хранения кэша
         os.makedirs(self.cache_dir, exist_ok=True)  # Создаём папку, если её нет
+        # Чеки хранятся в SQLite по шардам (день, ККТ) с индексами по дню/точке/товару
+        self.store = ReceiptStore(os.path.join(self.cache_dir, "receipts.db"))
+        # LRU разобранных шардов в памяти перед хранилищем чеков
+        self.day_cache = DayCache(config.MEMORY_CACHE_MAX_ENTRIES)
+        # Закодированные NDJSON-строки за день (потоковый /api/receipts) — отдаются без разбора и кодирования
+        self.encoded_day_cache = DayCache(config.ENCODED_DAY_CACHE_MAX_ENTRIES)
+        # Общий HTTP-клиент с пулом keep-alive соединений для всех запросов к СБИС
+        self.client = SBISClient()
+        # Общий пул для параллельной загрузки отчётов по (ККТ, день)
+        self.fetcher = ConcurrentFetcher(max_in_flight=config.FETCH_MAX_WORKERS)
+        # Реестр ККТ с TTL: список не запрашивается у API на каждом запросе
+        self.kkt_registry = KKTRegistry(
+            self._load_kkts,
+            ttl_seconds=config.KKT_REGISTRY_TTL_SECONDS,
+            cache_file=os.path.join(self.cache_dir, "kkts.json")
+        )
+        # Одновременные одинаковые запросы чеков выполняются один раз
+        self.receipts_flight = SingleFlight()
+        # Сопоставление названий товаров с id справочника при загрузке чеков
+        self.product_resolver = None
+        # Обработчики сохранённых шардов: выполняются по очереди в отдельном потоке, вне запроса
+        self.ingest_listeners = []
+        self._ingest_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sbis-ingest")
+
+    def set_product_resolver(self, resolver):
+        """
+        resolver(names) -> {название: id товара} вызывается для позиций каждой загрузки из API
+        до сохранения: id хранятся вместе с позициями и итогами, и аналитика группирует
+        по ним, а не по названиям. Без resolver позиции группируются по названию.
+        """
+        self.product_resolver = resolver
 
-    def _load_cached_day(self, date_str):
-        """Загружает данные за конкретный день из кэша."""
-        cache_file = os.path.join(self.cache_dir, f"{date_str}.json")
+    def _assign_product_ids(self, receipts):
+        if self.product_resolver is None:
+            return
+        items = [item for receipt in receipts for item in receipt.get("items", [])]
+        if not items:
+            return
         try:
-            if os.path.exists(cache_file):
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return None
+            product_ids = self.product_resolver(item.name for item in items)
         except Exception as e:
-            logger.error(f"Ошибка загрузки кэша для {date_str}: {str(e)}")
-            return None
+            logger.error(f"Ошибка сопоставления товаров со справочником: {str(e)}")
+            return
+        for item in items:
+            item.product_id = product_ids.get(item.name)
+
+    def add_ingest_listener(self, listener):
+        """
+        listener(shards) вызывается со списком шардов (day, reg_id, point_name), сохранённых
+        в кэш за одну синхронизацию (новые загрузки и дозагрузки); чеки шардов целиком
+        читаются из self.store. Несохранённые данные (ошибки, тестовые чеки) не передаются.
+        Обработчики выполняются в фоновом потоке по одному вызову за раз, в порядке сохранения.
+        """
+        self.ingest_listeners.append(listener)
+
+    def _notify_ingest(self, shards):
+        if shards and self.ingest_listeners:
+            self._ingest_executor.submit(self._run_ingest_listeners, shards)
+
+    def _run_ingest_listeners(self, shards):
+        for listener in self.ingest_listeners:
+            try:
+                listener(shards)
+            except Exception as e:
+                logger.error(f"Ошибка обработки сохранённых чеков ({len(shards)} шардов): {str(e)}")
+
+    def _cached_shards(self):
+        """Возвращает манифест загруженных шардов {(day, reg_id): saved_at}."""
+        try:
+            return self.day_cache.stamps(self.store.file_token(), self.store.shard_stamps)
+        except Exception as e:
+            logger.error(f"Ошибка чтения манифеста кэша: {str(e)}")
+            return {}
 
-    def _save_cached_day(self, date_str, data):
-        """Сохраняет данные за конкретный день в кэш."""
-        cache_file = os.path.join(self.cache_dir, f"{date_str}.json")
+    def _load_cached_shards(self, shards, stamps):
+        """
+        Загружает чеки шардов (day, reg_id) из кэша.
+        Сначала смотрит в LRU в памяти, недостающие шарды читает из хранилища одним запросом.
+        """
+        result = {}
+        missing = []
+        for shard in shards:
+            receipts = self.day_cache.get(shard, stamps[shard].saved_at)
+            if receipts is None:
+                missing.append(shard)
+            else:
+                result[shard] = receipts
+
+        if missing:
+            days = [day for day, _ in missing]
+            reg_ids = sorted({reg_id for _, reg_id in missing})
+            loaded = self.store.load_shards(min(days), max(days), reg_ids)
+            for shard in missing:
+                result[shard] = loaded.get(shard, [])
+                self.day_cache.put(shard, stamps[shard].saved_at, result[shard])
+        return result
+
+    def _save_cached_shard(self, date_str, kkt, fetched, append=False):
+        """
+        Сохраняет данные ККТ за конкретный день в кэш.
+        append=True дописывает дозагруженные чеки к уже сохранённым.
+        """
+        save = self.store.append_shard if append else self.store.save_shard
         try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False)
-            logger.info(f"Данные сохранены в кэш для даты {date_str}")
+            save(date_str, kkt.get("regId"), kkt.get("pointName"), fetched["receipts"],
+                 fetched["last_doc_number"], fetched["last_receive_dt"])
+            logger.info(f"Данные ККТ {kkt.get('regId')} сохранены в кэш для даты {date_str}")
+            return True
         except Exception as e:
-            logger.error(f"Ошибка сохранения кэша для {date_str}: {str(e)}")
+            logger.error(f"Ошибка сохранения кэша ККТ {kkt.get('regId')} для {date_str}: {str(e)}")
+            return False
+
+    def _is_shard_fresh(self, date_str, info, now):
+        """
+        Закрытый день неизменен: шард, сохранённый позже полуночи следующего дня плюс
+        CLOSED_DAY_GRACE_HOURS (время на опоздавшие чеки), больше не обновляется.
+        Незакрытый день (в том числе сегодняшний) считается свежим OPEN_DAY_TTL_SECONDS.
+        """
+        saved_at = datetime.fromisoformat(info.saved_at)
+        day_closed_at = datetime.strptime(date_str, '%Y-%m-%d') + timedelta(days=1, hours=config.CLOSED_DAY_GRACE_HOURS)
+        if saved_at >= day_closed_at:
+            return True
+        return (now - saved_at).total_seconds() < config.OPEN_DAY_TTL_SECONDS
+
+    def cache_stats(self):
+        """Статистика LRU-кэшей шардов и объединения запросов для мониторинга."""
+        return {
+            "receipts_day_cache": self.day_cache.stats(),
+            "receipts_encoded_day_cache": self.encoded_day_cache.stats(),
+            "receipts_single_flight": self.receipts_flight.stats()
+        }
 
     def _clean_cache(self, max_age_days=90):
-        """Удаляет устаревшие файлы из кэша (старше max_age_days)."""
-        current_date = datetime.now()
-        for filename in os.listdir(self.cache_dir):
-            if filename.endswith(".json"):
-                try:
-                    date_str = filename.replace(".json", "")
-                    file_date = datetime.strptime(date_str, '%Y-%m-%d')
-                    age = (current_date - file_date).days
-                    if age > max_age_days:
-                        file_path = os.path.join(self.cache_dir, filename)
-                        os.remove(file_path)
-                        logger.info(f"Удалён устаревший кэш-файл: {filename}")
-                except Exception as e:
-                    logger.error(f"Ошибка при очистке кэша для файла {filename}: {str(e)}")
+        """Удаляет из кэша шарды за дни старше max_age_days."""
+        cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime('%Y-%m-%d')
+        try:
+            self.store.delete_older_than(cutoff)
+        except Exception as e:
+            logger.error(f"Ошибка при очистке кэша: {str(e)}")
 
     def auth(self):
         """Авторизация в SBIS API и получение SID."""
         try:
-            self.sid, self.token = get_sid_and_token()
+            self.sid, self.token = get_sid_and_token(client=self.client)
             if self.sid and self.token:
                 return self.sid
             else:
@@ -122,121 +259,294 @@ class SBISApp:
             self.token = "test-token-123"
             return self.sid
 
-    def get_kkts(self, sid):
-        """Получение списка кассовых аппаратов (KKT)."""
+    def _load_kkts(self, sid):
+        """Запрашивает список ККТ у API; при ошибке возвращает пустой список."""
         try:
-            kkts = get_kkts_list(sid)
-            if kkts:
-                return kkts
-            else:
-                logger.warning("Список KKT пуст, используем тестовые данные")
-                return TEST_KKTS
+            return get_kkts_list(sid, client=self.client)
         except Exception as e:
-            logger.error(f"Ошибка получения KKT: {e}, используем тестовые данные")
-            return TEST_KKTS
+            logger.error(f"Ошибка получения KKT: {e}")
+            return []
+
+    def get_kkts(self, sid):
+        """Получение списка кассовых аппаратов (KKT) из реестра (обновляется по TTL)."""
+        kkts = self.kkt_registry.get(sid)
+        if kkts:
+            return kkts
+        logger.warning("Список KKT пуст, используем тестовые данные")
+        return TEST_KKTS
+
+    def refresh_kkts(self, sid):
+        """Принудительно обновляет реестр ККТ."""
+        kkts = self.kkt_registry.refresh(sid)
+        if kkts:
+            return kkts
+        logger.warning("Список KKT пуст, используем тестовые данные")
+        return TEST_KKTS
+
+    def _fetch_kkt_day(self, sid, kkt, period_date_from, period_date_to, since=None):
+        """
+        Загружает и обрабатывает чеки одной ККТ за один день, страница за страницей.
+        since — запись манифеста (ShardInfo) для дозагрузки только документов после последнего
+        сохранённого. Возвращает словарь с чеками, признаком полноты загрузки (complete)
+        и номером/временем последнего документа. Неполные результаты (таймаут, сетевая ошибка)
+        не кэшируются; HTTP 401/403/404/500 пробрасываются.
+        """
+        reg_id = kkt.get("regId")
+        date_from = period_date_from
+        start_number = None
+        if since is not None and since.last_doc_number is not None:
+            start_number = since.last_doc_number + 1
+            date_from = since.last_receive_dt or period_date_from
+
+        fetched = {
+            "receipts": [],
+            "complete": False,
+            "last_doc_number": None,
+            "last_receive_dt": None
+        }
+        pages = iter_cash_report_pages(sid, reg_id, kkt.get("fsNumber"), date_from, period_date_to,
+                                       client=self.client, start_number=start_number)
+        try:
+            for page in pages:
+                for receipt_data in page:
+                    number = get_document_number(receipt_data)
+                    if number is not None and (fetched["last_doc_number"] is None or number > fetched["last_doc_number"]):
+                        fetched["last_doc_number"] = number
+                    processed = process_receipt(receipt_data)
+                    if processed:
+                        processed["point_name"] = kkt.get("pointName")
+                        fetched["receipts"].append(processed)
+                        receive_dt = processed.get("receiveDateTime", "")
+                        if receive_dt[:1].isdigit() and receive_dt > (fetched["last_receive_dt"] or ""):
+                            fetched["last_receive_dt"] = receive_dt
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"HTTP ошибка при получении отчета для ККТ {reg_id}: {e.response.status_code} - {e.response.text}")
+            if e.response.status_code in [401, 403, 404, 500]:
+                raise  # Поднимаем исключение для обновления SID
+            return fetched
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Ошибка при получении отчета для ККТ {reg_id}: {str(e)}")
+            return fetched
+
+        fetched["complete"] = True
+        if not fetched["receipts"]:
+            logger.info(f"Нет {'новых ' if start_number else ''}данных для ККТ {reg_id} за период {period_date_from} - {period_date_to}")
+        return fetched
 
     def get_receipts(self, sid, date_from, date_to, point_name=None):
-        """Получение чеков за указанный период с разбивкой на периоды по 1 дню."""
+        """
+        Получение чеков за указанный период с разбивкой на периоды по 1 дню.
+        Одновременные вызовы с теми же (период, точка, SID) объединяются в один:
+        все получают один и тот же результат, который нельзя изменять.
+        """
+        key = (date_from, date_to, point_name, sid)
+        return self.receipts_flight.do(key, self._get_receipts, sid, date_from, date_to, point_name)
+
+    def _plan_shards(self, sid, date_from, date_to, point_name=None):
+        """
+        Разбивает период на шарды (день, ККТ) и по манифесту кэша определяет, какие из них
+        нужно загрузить или дозагрузить. Возвращает (shards, tasks, kkts_by_reg_id, stamps).
+        """
+        # Получаем список KKT
+        kkts = self.get_kkts(sid)
+        if not kkts:
+            logger.warning("Список KKT пуст")
+            return [], [], {}, {}
+
+        # Преобразуем даты в объекты datetime
+        start = datetime.strptime(date_from, '%Y-%m-%d')
+        end = datetime.strptime(date_to, '%Y-%m-%d')
+
+        # Разбиваем период на отрезки по 1 дню
+        periods = []
+        current_start = start
+        while current_start < end:
+            current_end = min(current_start + timedelta(days=1), end)
+            periods.append((current_start.strftime('%Y-%m-%d'), current_end.strftime('%Y-%m-%d')))
+            current_start = current_end
+
+        # Определяем по манифесту, каких шардов (день, ККТ) не хватает и какие устарели
+        selected_kkts = kkts
+        if point_name:
+            selected_kkts = self.kkt_registry.by_point(point_name) or [kkt for kkt in kkts if kkt.get("pointName") == point_name]
+        kkts_by_reg_id = {kkt.get("regId"): kkt for kkt in selected_kkts}
+        stamps = self._cached_shards()
+        now = datetime.now()
+        shards = []
+        tasks = []
+        for period_date_from, period_date_to in periods:
+            for kkt in selected_kkts:
+                shard = (period_date_from, kkt.get("regId"))
+                shards.append(shard)
+                info = stamps.get(shard)
+                if info is None:
+                    tasks.append((shard, (sid, kkt, period_date_from, period_date_to)))
+                elif not self._is_shard_fresh(period_date_from, info, now):
+                    tasks.append((shard, (sid, kkt, period_date_from, period_date_to, info)))
+        return shards, tasks, kkts_by_reg_id, stamps
+
+    def receipts_version(self, sid, date_from, date_to, point_name=None):
+        """
+        Версия данных о продажах за период для кэширования производных результатов.
+        Возвращает отпечаток файлов хранилища, если все шарды периода сохранены и свежи
+        (повторный запрос ничего не загрузит), иначе None — данные ещё изменятся.
+        """
+        shards, tasks, _, _ = self._plan_shards(sid, date_from, date_to, point_name)
+        if not shards or tasks:
+            return None
+        return self.store.file_token()
+
+    def _sync_shards(self, sid, date_from, date_to, point_name=None):
+        """
+        Приводит кэш за период в актуальное состояние: отсутствующие и устаревшие
+        пары (день, ККТ) загружаются параллельно и сохраняются.
+        Возвращает (shards, stamps, uncached): шарды периода в порядке дней и ККТ,
+        манифест кэша и данные шардов, которые не удалось сохранить (ошибки, тестовые данные).
+        """
+        shards, tasks, kkts_by_reg_id, stamps = self._plan_shards(sid, date_from, date_to, point_name)
+
+        # Запрашиваем недостающие и дозагружаем устаревшие шарды одновременно
+        if tasks:
+            logger.info(f"Запрашиваем данные для {len(tasks)} из {len(shards)} пар (день, ККТ)")
+        results = self.fetcher.run(tasks, self._fetch_kkt_day)
+
+        # Сохраняем только полные результаты; остальное отдаём, не кэшируя
+        uncached = {}
+        saved = []
+        for shard, (fetched, error) in results.items():
+            period_date_from, reg_id = shard
+            kkt = kkts_by_reg_id[reg_id]
+            info = stamps.get(shard)
+            if error is not None:
+                logger.error(f"Ошибка получения данных для ККТ {reg_id}: {str(error)}")
+                if info is None:
+                    # Если ошибка, добавляем тестовые данные за этот день
+                    uncached[shard] = _test_receipts(kkt.get("pointName"))
+                    self._assign_product_ids(uncached[shard])
+                continue
+            self._assign_product_ids(fetched["receipts"])
+            if not fetched["complete"]:
+                if info is None:
+                    uncached[shard] = fetched["receipts"]
+                continue
+            # Дозагрузка дописывается к шарду, если известен последний документ; иначе шард перезаписывается
+            append = info is not None and info.last_doc_number is not None
+            if self._save_cached_shard(period_date_from, kkt, fetched, append=append):
+                saved.append((period_date_from, reg_id, kkt.get("pointName")))
+            elif info is None:
+                uncached[shard] = fetched["receipts"]
+
+        self._notify_ingest(saved)
+
+        if tasks:
+            stamps = self._cached_shards()
+        return shards, stamps, uncached
+
+    def _get_receipts(self, sid, date_from, date_to, point_name=None):
         try:
-            # Получаем список KKT
-            kkts = self.get_kkts(sid)
-            if not kkts:
-                logger.warning("Список KKT пуст")
-                return []
+            shards, stamps, uncached = self._sync_shards(sid, date_from, date_to, point_name)
 
-            # Преобразуем даты в объекты datetime
-            start = datetime.strptime(date_from, '%Y-%m-%d')
-            end = datetime.strptime(date_to, '%Y-%m-%d')
+            # Читаем сохранённые шарды из кэша (устаревшие, но не обновлённые — как есть)
+            receipts_by_shard = self._load_cached_shards([shard for shard in shards if shard in stamps and shard not in uncached], stamps)
+            receipts_by_shard.update(uncached)
 
-            # Разбиваем период на отрезки по 1 дню
+            # Собираем результат в порядке дней и ККТ, чтобы он не зависел от порядка ответов
             all_receipts = []
-            current_start = start
-            while current_start < end:
-                current_end = min(current_start + timedelta(days=1), end)
-                period_date_from = current_start.strftime('%Y-%m-%d')
-                period_date_to = current_end.strftime('%Y-%m-%d')
-
-                # Проверяем кэш для текущего дня
-                cached_data = self._load_cached_day(period_date_from)
-                if cached_data:
-                    logger.info(f"Данные найдены в кэше для {period_date_from}")
-                    # Фильтруем данные, если запрошена конкретная точка
-                    if point_name:
-                        cached_data = [r for r in cached_data if r["point_name"] == point_name]
-                    all_receipts.extend(cached_data)
-                    current_start = current_end
-                    continue
-
-                logger.info(f"Запрашиваем данные за период: {period_date_from} - {period_date_to}")
-
-                # Собираем данные по всем KKT за текущий день
-                daily_receipts = []
-                for kkt in kkts:
-                    reg_id = kkt.get("regId")
-                    fs_number = kkt.get("fsNumber")
-                    kkt_point_name = kkt.get("pointName")
-
-                    if point_name and kkt_point_name != point_name:
-                        continue  # Пропускаем KKT, если точка не совпадает
-
-                    # Запрашиваем отчёт для KKT
-                    try:
-                        report = get_cash_report(sid, reg_id, fs_number, period_date_from, period_date_to)
-                        if not report:
-                            logger.info(f"Нет данных для ККТ {reg_id} за период {period_date_from} - {period_date_to}")
-                            continue
-
-                        # Обрабатываем чеки
-                        for receipt_data in report:
-                            processed = process_receipt(receipt_data)
-                            if processed:
-                                processed["point_name"] = kkt_point_name
-                                daily_receipts.append(processed)
-                    except Exception as e:
-                        logger.error(f"Ошибка получения данных для ККТ {reg_id}: {str(e)}")
-                        # Если ошибка, добавляем тестовые данные за этот день
-                        test_data = [r for r in TEST_RECEIPTS if r["point_name"] == kkt_point_name]
-                        daily_receipts.extend(test_data)
-
-                # Сохраняем данные за день в кэш
-                self._save_cached_day(period_date_from, daily_receipts)
-                all_receipts.extend(daily_receipts)
-                current_start = current_end
+            for shard in shards:
+                all_receipts.extend(receipts_by_shard.get(shard, []))
 
         except Exception as e:
             logger.error(f"Ошибка получения чеков: {e}, используем тестовые данные")
             # Фильтруем тестовые данные по точке продаж, если указана
-            if point_name:
-                return [r for r in TEST_RECEIPTS if r["point_name"] == point_name]
-            return TEST_RECEIPTS
-
-        # Агрегируем данные
-        aggregated = {}
-        for receipt in all_receipts:
-            point = receipt.get("point_name", "Неизвестная точка")
-            items = receipt.get("items", [])
-            total_sum = receipt.get("totalSum", 0)
-
-            if point not in aggregated:
-                aggregated[point] = {
-                    "point_name": point,
-                    "items": [],
-                    "total_sum": 0
-                }
-
-            for item in items:
-                aggregated[point]["items"].append({
-                    "name": item.get("name", "Неизвестный товар"),
-                    "quantity": item.get("quantity", 0),
-                    "total_sum": item.get("sum", 0),
-                    "receiveDateTime": receipt.get("receiveDateTime", "")
-                })
-            aggregated[point]["total_sum"] += total_sum
-
-        result = list(aggregated.values())
+            return aggregate_receipts(r for r in TEST_RECEIPTS if not point_name or r["point_name"] == point_name)
+
+        result = aggregate_receipts(all_receipts)
         logger.info(f"Получено {len(result)} записей для ККТ")
 
         # Очищаем устаревшие данные из кэша
         self._clean_cache(max_age_days=90)
 
-        return result
\ No newline at end of file
+        return result
+
+    def iter_receipts_ndjson(self, sid, date_from, date_to, point_name=None):
+        """
+        Потоковый вариант get_receipts в формате NDJSON: сразу загружает недостающие шарды
+        периода (ошибки загрузки выбрасываются здесь, до начала выдачи) и возвращает генератор,
+        который выдаёт по одному дню закодированные строки — итоги точек за день
+        ({day, point_name, items, total_sum}), по строке на точку. В памяти одновременно
+        только один день. Строки сохранённых дней кэшируются закодированными и при повторном
+        запросе отдаются без чтения чеков и повторного кодирования.
+        """
+        shards, stamps, uncached = self._sync_shards(sid, date_from, date_to, point_name)
+        return self._iter_encoded_days(shards, stamps, uncached)
+
+    def _iter_encoded_days(self, shards, stamps, uncached):
+        shards_by_day = {}
+        for shard in shards:
+            shards_by_day.setdefault(shard[0], []).append(shard)
+
+        for day, day_shards in shards_by_day.items():
+            # Кэшируются только дни, все шарды которых сохранены; отметка — их saved_at
+            key = (day, tuple(reg_id for _, reg_id in day_shards))
+            stamp = None
+            if all(shard in stamps and shard not in uncached for shard in day_shards):
+                stamp = tuple(stamps[shard].saved_at for shard in day_shards)
+                payload = self.encoded_day_cache.get(key, stamp)
+                if payload is not None:
+                    yield payload
+                    continue
+
+            receipts_by_shard = self._load_cached_shards([shard for shard in day_shards if shard in stamps and shard not in uncached], stamps)
+            receipts_by_shard.update((shard, uncached[shard]) for shard in day_shards if shard in uncached)
+            points = aggregate_receipts(receipt for shard in day_shards for receipt in receipts_by_shard.get(shard, []))
+            payload = b"".join(json_codec.dumps(dict(point_to_json(point), day=day)) + b"\n" for point in points)
+            if stamp is not None:
+                self.encoded_day_cache.put(key, stamp, payload)
+            yield payload
+
+    def get_daily_rollup(self, sid, date_from, date_to, point_name=None):
+        """
+        Итоги продаж по (день, точка, товар) за период: [{day, point_name, product_id, name, quantity, total_sum}].
+        Для сохранённых шардов читаются готовые итоги из кэша, без загрузки позиций чеков;
+        шарды, которые не удалось сохранить, сворачиваются в памяти.
+        Результат общий для одновременных вызовов и не должен изменяться.
+        """
+        key = ("rollup", date_from, date_to, point_name, sid)
+        return self.receipts_flight.do(key, self._get_daily_rollup, sid, date_from, date_to, point_name)
+
+    def _get_daily_rollup(self, sid, date_from, date_to, point_name=None):
+        shards, stamps, uncached = self._sync_shards(sid, date_from, date_to, point_name)
+        if not shards:
+            return []
+
+        reg_ids = sorted({reg_id for day, reg_id in shards if (day, reg_id) in stamps})
+        days = [day for day, reg_id in shards]
+        rows = self.store.load_rollups(min(days), max(days), reg_ids)
+
+        # Несохранённые шарды (ошибки, неполные загрузки) сворачиваем так же, как итоги в хранилище:
+        # по id товара, а для позиций без id — по названию
+        extra = {}
+        for (day, reg_id), receipts in uncached.items():
+            for receipt in receipts:
+                point = receipt.get("point_name", "Неизвестная точка")
+                for item in receipt.get("items", []):
+                    product_key = item.name if item.product_id is None else item.product_id
+                    totals = extra.setdefault((day, point, product_key), [0, 0, item.product_id, item.name])
+                    totals[0] += item.quantity
+                    totals[1] += item.sum
+        if extra:
+            for row in rows:
+                product_key = row["name"] if row["product_id"] is None else row["product_id"]
+                totals = extra.pop((row["day"], row["point_name"], product_key), None)
+                if totals:
+                    row["quantity"] += totals[0]
+                    row["total_sum"] += totals[1]
+            rows.extend(
+                {"day": day, "point_name": point, "product_id": totals[2], "name": totals[3],
+                 "quantity": totals[0], "total_sum": totals[1]}
+                for (day, point, _), totals in extra.items()
+            )
+            rows.sort(key=lambda row: (row["day"], row["point_name"], row["name"]))
+
+        logger.info(f"Получено {len(rows)} строк итогов по дням за {date_from} - {date_to}")
+        return rows
@@ -37,4 +37,52 @@ logger.info(f"SBIS_INN: {INN}")
 
 # Проверяем, что все переменные загружены
 if not all([APP_CLIENT_ID, LOGIN, PASSWORD, INN]):
-    logger.error("Одна или несколько переменных окружения не загружены! Проверьте файл .env")
\ No newline at end of file
+    logger.error("Одна или несколько переменных окружения не загружены! Проверьте файл .env")
+
+# Базовый адрес API СБИС
+API_BASE_URL = "https://api.sbis.ru"
+
+# Параметры параллельной загрузки отчётов по ККТ
+FETCH_MAX_WORKERS = int(os.getenv("SBIS_FETCH_MAX_WORKERS", "6"))  # Максимум одновременных запросов
+RATE_LIMIT_PER_HOST = float(os.getenv("SBIS_RATE_LIMIT_PER_HOST", "10"))  # Запросов в секунду на хост (0 — без ограничения)
+
+# Параметры HTTP-клиента СБИС (пул соединений, повторы, таймауты)
+HTTP_POOL_SIZE = int(os.getenv("SBIS_HTTP_POOL_SIZE", "10"))  # Соединений в пуле на хост
+HTTP_MAX_RETRIES = int(os.getenv("SBIS_HTTP_MAX_RETRIES", "3"))  # Повторы при 429/5xx и сетевых ошибках
+HTTP_BACKOFF_FACTOR = float(os.getenv("SBIS_HTTP_BACKOFF_FACTOR", "0.5"))  # Пауза между повторами: factor * 2^n сек
+HTTP_TIMEOUTS = {  # Таймауты (сек) по типам запросов
+    "auth": float(os.getenv("SBIS_TIMEOUT_AUTH", "10")),
+    "kkts": float(os.getenv("SBIS_TIMEOUT_KKTS", "10")),
+    "docs": float(os.getenv("SBIS_TIMEOUT_DOCS", "20")),
+}
+
+# Постраничная загрузка документов ККТ
+DOCS_PAGE_SIZE = int(os.getenv("SBIS_DOCS_PAGE_SIZE", "200"))  # Документов на страницу
+DOCS_CURSOR_PARAM = os.getenv("SBIS_DOCS_CURSOR_PARAM", "fromNumber")  # Параметр «начиная с номера ФД»
+
+# Размер LRU-кэша разобранных шардов в памяти процесса (записей «день + ККТ»)
+MEMORY_CACHE_MAX_ENTRIES = int(os.getenv("SBIS_MEMORY_CACHE_MAX_ENTRIES", "2000"))
+
+# Политика свежести кэша чеков
+OPEN_DAY_TTL_SECONDS = int(os.getenv("SBIS_OPEN_DAY_TTL_SECONDS", "300"))  # Как часто дозагружать незакрытый день
+CLOSED_DAY_GRACE_HOURS = float(os.getenv("SBIS_CLOSED_DAY_GRACE_HOURS", "3"))  # Сколько ждать опоздавшие чеки после полуночи
+
+# Фоновый прогрев кэша (список ККТ и чеки за скользящее окно)
+PREFETCH_ENABLED = os.getenv("SBIS_PREFETCH_ENABLED", "1") == "1"
+PREFETCH_INTERVAL_MINUTES = int(os.getenv("SBIS_PREFETCH_INTERVAL_MINUTES", "15"))
+PREFETCH_WINDOW_DAYS = int(os.getenv("SBIS_PREFETCH_WINDOW_DAYS", "60"))
+PREFETCH_CHUNK_DAYS = int(os.getenv("SBIS_PREFETCH_CHUNK_DAYS", "7"))  # Дней за один вызов get_receipts
+PREFETCH_JITTER_SECONDS = float(os.getenv("SBIS_PREFETCH_JITTER_SECONDS", "30"))
+PREFETCH_STARTUP_DELAY_SECONDS = float(os.getenv("SBIS_PREFETCH_STARTUP_DELAY_SECONDS", "5"))
+
+# Реестр ККТ: как долго список считается актуальным
+KKT_REGISTRY_TTL_SECONDS = int(os.getenv("SBIS_KKT_REGISTRY_TTL_SECONDS", "3600"))
+
+# Кэш готовых планов производства в памяти процесса (записей «дата + точка + метод»)
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("SBIS_PLAN_CACHE_MAX_ENTRIES", "256"))
+
+# Кодек JSON для файлов данных и ответов API: auto (orjson, если установлен), orjson или json
+JSON_CODEC = os.getenv("SBIS_JSON_CODEC", "auto")
+
+# Кэш закодированных NDJSON-ответов по дням в памяти процесса (записей «день + набор ККТ»)
+ENCODED_DAY_CACHE_MAX_ENTRIES = int(os.getenv("SBIS_ENCODED_DAY_CACHE_MAX_ENTRIES", "500"))
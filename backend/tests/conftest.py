@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули приложения импортируются так же, как из app.py: относительно каталога backend
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
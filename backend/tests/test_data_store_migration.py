@@ -0,0 +1,77 @@
+import sqlite3
+
+import pytest
+
+from utils.data_store import DataStore, SCHEMA_VERSION
+
+# Остатки в схемах версий 1–2: таблица stocks вместо журнала движений
+STOCKS_V1 = """
+CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE stocks (point TEXT NOT NULL, product TEXT NOT NULL, quantity INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (point, product));
+CREATE TABLE writeoffs (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT NOT NULL, point TEXT NOT NULL, product_id INTEGER NOT NULL, quantity INTEGER NOT NULL);
+CREATE INDEX idx_writeoffs_date ON writeoffs (date);
+INSERT INTO products (id, name) VALUES (1, 'Хлеб');
+INSERT INTO stocks (point, product, quantity) VALUES ('Точка', 'Хлеб', 7);
+"""
+
+# Журнал движений версии 3: без столбца ref и таблицы пар
+STOCKS_V3 = """
+CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE stock_movements (id INTEGER PRIMARY KEY AUTOINCREMENT, at TEXT NOT NULL, point TEXT NOT NULL, product TEXT NOT NULL,
+    kind TEXT NOT NULL, delta INTEGER NOT NULL DEFAULT 0, set_to INTEGER);
+INSERT INTO products (id, name) VALUES (1, 'Хлеб');
+INSERT INTO stock_movements (at, point, product, kind, delta, set_to) VALUES ('2020-01-01T00:00:00', 'Точка', 'Хлеб', 'set', 7, 7);
+"""
+
+# Версия 4: пары (точка, товар) журнала
+STOCKS_V4 = STOCKS_V3 + """
+CREATE TABLE stock_pairs (point TEXT NOT NULL, product TEXT NOT NULL, PRIMARY KEY (point, product));
+INSERT INTO stock_pairs (point, product) VALUES ('Точка', 'Хлеб');
+"""
+
+
+@pytest.mark.parametrize(
+    "version, schema",
+    [(1, STOCKS_V1), (2, STOCKS_V1), (3, STOCKS_V3), (4, STOCKS_V4)],
+    ids=["v1", "v2", "v3", "v4"]
+)
+def test_migrates_stocks_from_old_schema(tmp_path, version, schema):
+    db_path = str(tmp_path / "app.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(schema)
+    conn.execute(f"PRAGMA user_version = {version}")
+    conn.commit()
+    conn.close()
+
+    store = DataStore(db_path, json_dir=str(tmp_path))
+
+    assert store.get_stocks() == {"Точка": {"Хлеб": 7}}
+    conn = store._connect()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert {"product_id", "ref"} <= {row[1] for row in conn.execute("PRAGMA table_info(stock_movements)")}
+    assert store.replace_sales({"sale:2099-01-01:K1": ("Точка", [("2099-01-01T10:00:00", 1, 2)])}) == 1
+    assert store.get_stocks("2099-01-02") == {"Точка": {"Хлеб": 5}}
+
+
+def test_merges_stock_of_product_name_variants(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(STOCKS_V3 + """
+INSERT INTO products (id, name) VALUES (46, 'хлеб ');
+INSERT INTO stock_movements (at, point, product, kind, delta, set_to) VALUES ('2020-01-02T00:00:00', 'Точка', 'хлеб ', 'add', 3, NULL);
+""")
+    conn.execute("PRAGMA user_version = 5")
+    conn.commit()
+    conn.close()
+
+    store = DataStore(db_path, json_dir=str(tmp_path))
+
+    assert store.get_stocks() == {"Точка": {"Хлеб": 10}}
+    assert store.stock_product_ids("Точка") == [1]
+
+
+def test_reopening_current_schema_keeps_data(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    DataStore(db_path, json_dir=str(tmp_path)).update_stock("Точка", "Хлеб", "set", 3)
+
+    assert DataStore(db_path, json_dir=str(tmp_path)).get_stocks() == {"Точка": {"Хлеб": 3}}
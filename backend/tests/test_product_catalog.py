@@ -0,0 +1,14 @@
+from utils.data_store import DataStore
+from utils.product_utils import ProductCatalog
+
+
+def test_catalog_sees_products_added_by_another_process(tmp_path):
+    db_path = str(tmp_path / "app.db")
+    reader = ProductCatalog(DataStore(db_path, json_dir=str(tmp_path)))
+    writer = ProductCatalog(DataStore(db_path, json_dir=str(tmp_path)))
+    assert reader.get_id("Хлеб") is None
+
+    product_id = writer.resolve(["Хлеб"])["Хлеб"]
+
+    assert reader.get_id("хлеб ") == product_id
+    assert reader.name(product_id) == "Хлеб"
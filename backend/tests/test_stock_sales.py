@@ -0,0 +1,74 @@
+from sbis_project.line_items import LineItem
+from sbis_project.receipt_store import ReceiptStore
+from utils.data_store import DataStore
+from utils.product_utils import ProductCatalog
+from utils.stock_utils import StockSalesRecorder
+
+DAY = "2026-01-10"
+
+
+def _receipt(time, name, quantity):
+    return {"items": [LineItem(name, quantity)], "totalSum": 0, "receiveDateTime": f"{DAY}T{time}",
+            "retailPlace": "", "point_name": "Точка"}
+
+
+def _setup(tmp_path):
+    data_store = DataStore(str(tmp_path / "app.db"), json_dir=str(tmp_path))
+    catalog = ProductCatalog(data_store)
+    receipt_store = ReceiptStore(str(tmp_path / "receipts.db"))
+    return data_store, catalog, receipt_store, StockSalesRecorder(data_store, receipt_store)
+
+
+def _save(catalog, receipt_store, receipts):
+    product_ids = catalog.resolve(item.name for receipt in receipts for item in receipt["items"])
+    for receipt in receipts:
+        for item in receipt["items"]:
+            item.product_id = product_ids[item.name]
+    receipt_store.save_shard(DAY, "K1", "Точка", receipts)
+
+
+def test_sales_before_set_in_same_hour_are_not_deducted_again(tmp_path):
+    data_store, catalog, receipt_store, recorder = _setup(tmp_path)
+    bread = catalog.resolve(["Хлеб"])["Хлеб"]
+    with data_store.transaction() as conn:
+        data_store._append_movement(conn, f"{DAY}T10:30:00", "Точка", bread, "set", 0, 20)
+    _save(catalog, receipt_store, [
+        _receipt("10:05:00", "Хлеб", 3),
+        _receipt("10:50:00", "хлеб ", 2),
+        _receipt("10:55:00", "Кофе", 1),
+    ])
+
+    recorder([(DAY, "K1", "Точка")])
+
+    assert data_store.get_stocks(f"{DAY}T23:00:00") == {"Точка": {"Хлеб": 18}}
+
+
+def test_resaving_shard_replaces_its_sales(tmp_path):
+    data_store, catalog, receipt_store, recorder = _setup(tmp_path)
+    bread = catalog.resolve(["Хлеб"])["Хлеб"]
+    with data_store.transaction() as conn:
+        data_store._append_movement(conn, f"{DAY}T08:00:00", "Точка", bread, "set", 0, 20)
+    _save(catalog, receipt_store, [_receipt("10:05:00", "Хлеб", 3)])
+    recorder([(DAY, "K1", "Точка")])
+    version = data_store.version("stocks")
+
+    recorder([(DAY, "K1", "Точка")])
+    assert data_store.version("stocks") == version
+
+    _save(catalog, receipt_store, [_receipt("10:05:00", "Хлеб", 3), _receipt("11:00:00", "Хлеб", 4)])
+    recorder([(DAY, "K1", "Точка")])
+    assert data_store.get_stocks(f"{DAY}T23:00:00") == {"Точка": {"Хлеб": 13}}
+
+
+def test_writeoff_of_duplicate_product_reduces_canonical_stock(tmp_path):
+    data_store, catalog, _, _ = _setup(tmp_path)
+    with data_store.transaction() as conn:
+        conn.execute("INSERT INTO products (id, name) VALUES (3, 'Пирожок с мясом'), (46, 'пирожок  с мясом')")
+        data_store._backfill_product_aliases(conn)
+    data_store.update_stock("Точка", "ПИРОЖОК С МЯСОМ", "set", 10)
+
+    data_store.add_writeoffs([{"date": "2000-01-01", "point": "Точка", "product_id": 46, "quantity": 4}])
+
+    assert data_store.stock_product_ids("Точка") == [3]
+    assert data_store.get_stocks("2000-01-02") == {"Точка": {"Пирожок с мясом": -4}}
+    assert data_store.get_stocks() == {"Точка": {"Пирожок с мясом": 10}}
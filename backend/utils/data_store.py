@@ -0,0 +1,712 @@
+import os
+import logging
+import sqlite3
+import threading
+import unicodedata
+from contextlib import contextmanager
+from datetime import datetime
+from sbis_project import json_codec
+from sbis_project.json_file import read_json
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "data"
+DB_PATH = os.path.join(DATA_DIR, "app.db")
+
+# Версия схемы; данные здесь не кэш, поэтому при смене версии схема мигрируется, а не пересоздаётся
+SCHEMA_VERSION = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS product_aliases (
+    alias TEXT PRIMARY KEY,
+    product_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS writeoffs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    point TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_writeoffs_date_id ON writeoffs (date, id);
+CREATE INDEX IF NOT EXISTS idx_writeoffs_point_date_id ON writeoffs (point, date, id);
+CREATE INDEX IF NOT EXISTS idx_writeoffs_product_date_id ON writeoffs (product_id, date, id);
+CREATE TABLE IF NOT EXISTS writeoff_tombstones (
+    writeoff_id INTEGER PRIMARY KEY,
+    deleted_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS employees (
+    id INTEGER PRIMARY KEY,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    hours TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_employees_group ON employees (grp);
+CREATE TABLE IF NOT EXISTS salary_rates (
+    grp TEXT PRIMARY KEY,
+    payment_type TEXT NOT NULL,
+    hourly_rate REAL NOT NULL DEFAULT 0,
+    daily_rate REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Журнал остатков: товар — id основного товара справочника (варианты написания названия
+# учитываются как один товар). Отдельно от SCHEMA: в базах версий 3–5 эти таблицы пересоздаются
+STOCK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock_movements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    at TEXT NOT NULL,
+    point TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    delta INTEGER NOT NULL DEFAULT 0,
+    set_to INTEGER,
+    ref TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_stock_movements_pair_at ON stock_movements (point, product_id, at, id);
+CREATE INDEX IF NOT EXISTS idx_stock_movements_at ON stock_movements (at);
+CREATE TABLE IF NOT EXISTS stock_pairs (
+    point TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    PRIMARY KEY (point, product_id)
+);
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    point TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    at TEXT NOT NULL,
+    last_movement_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (point, product_id, at)
+);
+"""
+
+# Индексы версии 1, заменённые в версии 2 индексами (..., date, id) для постраничной выборки
+OBSOLETE_INDEXES = ("idx_writeoffs_date", "idx_writeoffs_point_date", "idx_writeoffs_product")
+
+# JSON-файлы, из которых данные переносятся при первом запуске
+JSON_FILES = {
+    "products": "products.json",
+    "stocks": "stocks.json",
+    "writeoffs": "writeoffs.json",
+    "employees": "employees.json",
+    "salary_rates": "salary_rates.json"
+}
+
+STOCK_OPERATIONS = ("add", "subtract", "set")
+# Метка движений "sale" одного шарда чеков (день, ККТ): по ней продажи шарда заменяются целиком
+SALE_REF = "sale:{day}:{reg_id}"
+# Снимок остатка товара в точке делается после стольких движений с предыдущего снимка,
+# поэтому остаток на любой момент — снимок плюс не больше стольких движений
+STOCK_SNAPSHOT_EVERY = 100
+# Списание уменьшает остаток в конце своего дня
+WRITEOFF_TIME = "T23:59:59"
+
+# Журнал списаний: размер страницы по умолчанию и максимальный
+WRITEOFFS_PAGE_SIZE = 500
+WRITEOFFS_MAX_PAGE_SIZE = 1000
+# Сколько удалённых списаний накапливается до уплотнения журнала
+WRITEOFFS_COMPACT_THRESHOLD = 500
+
+
+def normalize_product_name(name):
+    """
+    Ключ сопоставления названий товара: регистр, «ё», лишние и неразрывные пробелы
+    не различаются («Пирожок с мясом» и «пирожок  с мясом » — один товар).
+    """
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().replace("ё", "е").split())
+
+
+def _employee(row):
+    return {"id": row[0], "firstName": row[1], "lastName": row[2], "group": row[3], "hours": json_codec.loads(row[4])}
+
+
+def _rate(row):
+    return {"group": row[0], "paymentType": row[1], "hourlyRate": row[2], "dailyRate": row[3]}
+
+
+def _writeoff(row):
+    return {"id": row[0], "date": row[1], "point": row[2], "product_id": row[3], "quantity": row[4]}
+
+
+class DataStore:
+    """
+    Хранилище данных приложения (товары, остатки, списания, сотрудники, ставки) в SQLite (WAL).
+    Каждая операция — одна транзакция BEGIN IMMEDIATE: чтение и запись выполняются под одной
+    блокировкой базы, поэтому одновременные запросы из разных потоков и процессов не теряют
+    изменения друг друга, а запись затрагивает только изменённые строки, а не весь файл.
+    """
+
+    def __init__(self, db_path=DB_PATH, json_dir=DATA_DIR):
+        self.db_path = db_path
+        self._local = threading.local()
+        # executescript фиксирует открытую транзакцию, поэтому схема создаётся до неё
+        self._connect().executescript(SCHEMA)
+        with self.transaction() as conn:
+            # Версия читается под блокировкой: перенос из JSON выполнит только один процесс
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            # Журнал остатков версий 3–5 ведётся по названиям товаров: его таблицы пересоздаёт миграция
+            ledger_by_name = "product" in self._columns(conn, "stock_movements")
+            if not ledger_by_name:
+                self._create_stock_tables(conn)
+            if version == 0:
+                self._import_json(conn, json_dir)
+            if version < 2:
+                for index in OBSOLETE_INDEXES:
+                    conn.execute(f"DROP INDEX IF EXISTS {index}")
+            if 0 < version < 6:
+                self._backfill_product_aliases(conn)
+            if 0 < version < 3:
+                self._migrate_stocks_to_ledger(conn)
+            if ledger_by_name:
+                self._migrate_stock_ledger_to_ids(conn)
+            # Индекс по ref создаётся после миграции: в журнале до версии 5 столбца нет
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_ref ON stock_movements (ref)")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @staticmethod
+    def _columns(conn, table):
+        return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+    @staticmethod
+    def _create_stock_tables(conn):
+        for statement in STOCK_SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+
+    def _connect(self):
+        """Возвращает соединение текущего потока; транзакциями управляет transaction()."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Транзакция с блокировкой записи с самого начала: прочитанное внутри не устареет до COMMIT."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _import_json(self, conn, json_dir):
+        """Переносит данные из JSON-файлов прежнего формата (если они есть) в пустую базу."""
+        data = {}
+        for name, file_name in JSON_FILES.items():
+            path = os.path.join(json_dir, file_name)
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                data[name] = read_json(path)
+
+        conn.executemany(
+            "INSERT OR IGNORE INTO products (id, name) VALUES (?, ?)",
+            [(product["id"], product["name"]) for product in data.get("products", [])]
+        )
+        self._backfill_product_aliases(conn)
+        now = datetime.now().isoformat()
+        for point, products in data.get("stocks", {}).items():
+            for product, quantity in products.items():
+                self._append_movement(conn, now, point, self._product_id(conn, product), "set", 0, quantity)
+        conn.executemany(
+            "INSERT INTO writeoffs (id, date, point, product_id, quantity) VALUES (?, ?, ?, ?, ?)",
+            [(w["id"], w["date"], w["point"], w["product_id"], w["quantity"]) for w in data.get("writeoffs", [])]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO employees (id, first_name, last_name, grp, hours) VALUES (?, ?, ?, ?, ?)",
+            [(e["id"], e["firstName"], e["lastName"], e["group"], json_codec.dumps(e.get("hours", {})).decode("utf-8"))
+             for e in data.get("employees", [])]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO salary_rates (grp, payment_type, hourly_rate, daily_rate) VALUES (?, ?, ?, ?)",
+            [(r["group"], r["paymentType"], r.get("hourlyRate", 0), r.get("dailyRate", 0)) for r in data.get("salary_rates", [])]
+        )
+        if data:
+            logger.info(f"Данные перенесены из JSON-файлов в {self.db_path}: {', '.join(sorted(data))}")
+
+    def _bump_version(self, conn, name):
+        conn.execute(
+            "INSERT INTO versions (name, version) VALUES (?, 1) "
+            "ON CONFLICT (name) DO UPDATE SET version = version + 1",
+            (name,)
+        )
+
+    def version(self, name):
+        """Счётчик изменений раздела (например, "stocks") для кэширования производных данных."""
+        row = self._connect().execute("SELECT version FROM versions WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    # Товары
+
+    def list_products(self):
+        rows = self._connect().execute("SELECT id, name FROM products ORDER BY id").fetchall()
+        return [{"id": product_id, "name": name} for product_id, name in rows]
+
+    def get_product(self, product_id):
+        row = self._connect().execute("SELECT id, name FROM products WHERE id = ?", (product_id,)).fetchone()
+        return {"id": row[0], "name": row[1]} if row else None
+
+    def product_aliases(self):
+        """Возвращает {нормализованное название: id товара}."""
+        return dict(self._connect().execute("SELECT alias, product_id FROM product_aliases").fetchall())
+
+    def add_products(self, products):
+        """
+        Заводит товары по парам (название, нормализованное название).
+        Если нормализованное название уже привязано к товару, новый товар не создаётся.
+        Возвращает ({нормализованное название: id}, список добавленных товаров).
+        """
+        ids = {}
+        added = []
+        with self.transaction() as conn:
+            for name, alias in products:
+                row = conn.execute("SELECT product_id FROM product_aliases WHERE alias = ?", (alias,)).fetchone()
+                if row is None:
+                    product_id, is_new = self._add_product(conn, name, alias)
+                    if is_new:
+                        added.append({"id": product_id, "name": name})
+                    row = (product_id,)
+                ids[alias] = row[0]
+        return ids, added
+
+    def _add_product(self, conn, name, alias):
+        """
+        Заводит товар name и привязывает к нему ещё не привязанное нормализованное название alias.
+        Возвращает (id, True, если товар новый).
+        """
+        cursor = conn.execute("INSERT OR IGNORE INTO products (name) VALUES (?)", (name,))
+        product_id = conn.execute("SELECT id FROM products WHERE name = ?", (name,)).fetchone()[0]
+        conn.execute("INSERT INTO product_aliases (alias, product_id) VALUES (?, ?)", (alias, product_id))
+        self._bump_version(conn, "products")
+        return product_id, bool(cursor.rowcount)
+
+    def _backfill_product_aliases(self, conn):
+        """
+        Привязывает нормализованные названия товаров, заведённых без псевдонимов (из JSON, до версии 6).
+        Товары привязываются по возрастанию id, поэтому из нескольких вариантов написания
+        основным остаётся самый первый.
+        """
+        rows = conn.execute("SELECT id, name FROM products ORDER BY id").fetchall()
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO product_aliases (alias, product_id) VALUES (?, ?)",
+            [(normalize_product_name(name), product_id) for product_id, name in rows]
+        )
+        if cursor.rowcount:
+            self._bump_version(conn, "products")
+
+    def _product_id(self, conn, name):
+        """id основного товара по названию в любом написании; отсутствующий товар заводится."""
+        alias = normalize_product_name(name)
+        row = conn.execute("SELECT product_id FROM product_aliases WHERE alias = ?", (alias,)).fetchone()
+        return row[0] if row else self._add_product(conn, " ".join(name.split()), alias)[0]
+
+    def _canonical_product_id(self, conn, product_id):
+        """id основного товара для товара product_id (дубликата названия); None, если товара нет."""
+        row = conn.execute("SELECT name FROM products WHERE id = ?", (product_id,)).fetchone()
+        return self._product_id(conn, row[0]) if row else None
+
+    # Остатки: журнал движений со снимками
+
+    def _migrate_stocks_to_ledger(self, conn):
+        """Переносит остатки из таблицы stocks (версии 1–2) в журнал движений начальными установками."""
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stocks'").fetchone():
+            return
+        now = datetime.now().isoformat()
+        for point, product, quantity in conn.execute("SELECT point, product, quantity FROM stocks ORDER BY rowid").fetchall():
+            self._append_movement(conn, now, point, self._product_id(conn, product), "set", 0, quantity)
+        conn.execute("DROP TABLE stocks")
+        logger.info("Остатки перенесены в журнал движений")
+
+    def _migrate_stock_ledger_to_ids(self, conn):
+        """
+        Переводит журнал остатков версий 3–5 с названий товаров на id основного товара:
+        движения вариантов написания одного товара сливаются в одну пару (точка, товар)
+        в прежнем порядке (id движений сохраняются), пары и снимки строятся заново.
+        """
+        ref = "ref" if "ref" in self._columns(conn, "stock_movements") else "NULL"
+        conn.execute("ALTER TABLE stock_movements RENAME TO stock_movements_by_name")
+        for index in ("idx_stock_movements_pair_at", "idx_stock_movements_at", "idx_stock_movements_ref"):
+            conn.execute(f"DROP INDEX IF EXISTS {index}")
+        conn.execute("DROP TABLE IF EXISTS stock_pairs")
+        conn.execute("DROP TABLE IF EXISTS stock_snapshots")
+        self._create_stock_tables(conn)
+
+        for (product,) in conn.execute("SELECT DISTINCT product FROM stock_movements_by_name").fetchall():
+            conn.execute(
+                "INSERT INTO stock_movements (id, at, point, product_id, kind, delta, set_to, ref) "
+                f"SELECT id, at, point, ?, kind, delta, set_to, {ref} FROM stock_movements_by_name WHERE product = ?",
+                (self._product_id(conn, product), product)
+            )
+        conn.execute("DROP TABLE stock_movements_by_name")
+        pairs = conn.execute("SELECT DISTINCT point, product_id FROM stock_movements").fetchall()
+        conn.executemany("INSERT INTO stock_pairs (point, product_id) VALUES (?, ?)", pairs)
+        for point, product_id in pairs:
+            self._refresh_snapshots(conn, point, product_id, "")
+        logger.info(f"Журнал остатков переведён на id товаров: {len(pairs)} пар (точка, товар)")
+
+    def _balances(self, conn, at, point=None, product_id=None):
+        """
+        Остатки на момент at (ISO-строка) {(point, product_id): количество}: последний снимок
+        не позже at плюс движения после него. Можно ограничить одной точкой и товаром.
+        Для каждой пары читается только её хвост журнала после снимка (диапазон индекса
+        (point, product_id, at, id)), а не весь журнал.
+        """
+        pair_filter = " WHERE p.point = ? AND p.product_id = ?" if point is not None else ""
+        pair_params = [point, product_id] if point is not None else []
+        # Последний снимок каждой пары не позже at (NULL, если снимка нет)
+        latest = (
+            "FROM stock_pairs p LEFT JOIN stock_snapshots s ON s.point = p.point AND s.product_id = p.product_id "
+            "AND s.at = (SELECT MAX(s2.at) FROM stock_snapshots s2 "
+            "WHERE s2.point = p.point AND s2.product_id = p.product_id AND s2.at <= ?)"
+        )
+
+        balances = {}
+        for snap_point, snap_product_id, quantity in conn.execute(
+            f"SELECT p.point, p.product_id, s.quantity {latest}{pair_filter}", [at, *pair_params]
+        ):
+            if quantity is not None:
+                balances[(snap_point, snap_product_id)] = quantity
+
+        # CROSS JOIN оставляет пары внешним циклом: движения ищутся по индексу от снимка своей пары
+        for move_point, move_product_id, delta, set_to in conn.execute(
+            f"SELECT p.point, p.product_id, m.delta, m.set_to {latest} "
+            "CROSS JOIN stock_movements m ON m.point = p.point AND m.product_id = p.product_id AND m.at <= ? "
+            "AND (m.at, m.id) > (COALESCE(s.at, ''), COALESCE(s.last_movement_id, 0))"
+            f"{pair_filter} ORDER BY p.point, p.product_id, m.at, m.id",
+            [at, at, *pair_params]
+        ):
+            key = (move_point, move_product_id)
+            balances[key] = set_to if set_to is not None else balances.get(key, 0) + delta
+        return balances
+
+    def _append_movement(self, conn, at, point, product_id, kind, delta, set_to=None, ref=None):
+        """Дописывает движение в журнал и обновляет снимки пары (см. _refresh_snapshots)."""
+        conn.execute("INSERT OR IGNORE INTO stock_pairs (point, product_id) VALUES (?, ?)", (point, product_id))
+        conn.execute(
+            "INSERT INTO stock_movements (at, point, product_id, kind, delta, set_to, ref) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (at, point, product_id, kind, delta, set_to, ref)
+        )
+        self._refresh_snapshots(conn, point, product_id, at)
+
+    def _refresh_snapshots(self, conn, point, product_id, since):
+        """
+        Обновляет снимки пары после изменения журнала начиная с момента since: снимки
+        не раньше since становятся неверными и удаляются. Затем после последнего снимка
+        не позже min(since, сейчас) снимок делается на каждом STOCK_SNAPSHOT_EVERY-м движении
+        (не позже сейчас): движения будущими датами (списания на конец дня, на даты вперёд)
+        не уводят снимки в будущее, и чтение остатков повторяет не больше
+        STOCK_SNAPSHOT_EVERY движений даже после пакетной записи.
+        """
+        conn.execute("DELETE FROM stock_snapshots WHERE point = ? AND product_id = ? AND at >= ?", (point, product_id, since))
+        self._bump_version(conn, "stocks")
+
+        now = datetime.now().isoformat()
+        last = conn.execute(
+            "SELECT at, last_movement_id FROM stock_snapshots WHERE point = ? AND product_id = ? AND at <= ? "
+            "ORDER BY at DESC LIMIT 1",
+            (point, product_id, min(since, now))
+        ).fetchone() or ("", 0)
+        while True:
+            row = conn.execute(
+                "SELECT at FROM stock_movements WHERE point = ? AND product_id = ? AND at <= ? AND (at, id) > (?, ?) "
+                "ORDER BY at, id LIMIT 1 OFFSET ?",
+                (point, product_id, now, *last, STOCK_SNAPSHOT_EVERY - 1)
+            ).fetchone()
+            if row is None:
+                return
+            # Снимок включает все движения своего момента
+            snapshot_at = row[0]
+            last_id = conn.execute(
+                "SELECT MAX(id) FROM stock_movements WHERE point = ? AND product_id = ? AND at = ?",
+                (point, product_id, snapshot_at)
+            ).fetchone()[0]
+            quantity = self._balances(conn, snapshot_at, point, product_id).get((point, product_id), 0)
+            conn.execute(
+                "INSERT OR REPLACE INTO stock_snapshots (point, product_id, at, last_movement_id, quantity) VALUES (?, ?, ?, ?, ?)",
+                (point, product_id, snapshot_at, last_id, quantity)
+            )
+            last = (snapshot_at, last_id)
+
+    def stock_product_ids(self, point):
+        """id товаров, остатки которых ведутся в точке (есть хотя бы одно движение)."""
+        rows = self._connect().execute("SELECT product_id FROM stock_pairs WHERE point = ? ORDER BY product_id", (point,))
+        return [row[0] for row in rows]
+
+    def replace_sales(self, sales_by_ref):
+        """
+        Заменяет движения "sale" по меткам: sales_by_ref {ref: (точка, [(время, id товара, количество)])},
+        ref — метка продаж одного шарда чеков. Все метки записываются одной транзакцией,
+        снимки каждой затронутой пары обновляются один раз. Метки, продажи которых
+        не изменились, журнал не меняют. Возвращает число изменённых меток.
+        """
+        changed = 0
+        first_at = {}
+        with self.transaction() as conn:
+            for ref, (point, sales) in sales_by_ref.items():
+                new_sales = sorted((at, point, product_id, -quantity) for at, product_id, quantity in sales)
+                old_sales = conn.execute(
+                    "SELECT at, point, product_id, delta FROM stock_movements WHERE ref = ? ORDER BY at, point, product_id, delta",
+                    (ref,)
+                ).fetchall()
+                if old_sales == new_sales:
+                    continue
+                changed += 1
+                conn.execute("DELETE FROM stock_movements WHERE ref = ?", (ref,))
+                conn.executemany(
+                    "INSERT INTO stock_movements (at, point, product_id, kind, delta, ref) VALUES (?, ?, ?, 'sale', ?, ?)",
+                    [(*sale, ref) for sale in new_sales]
+                )
+                for at, sale_point, product_id, _ in old_sales + new_sales:
+                    pair = (sale_point, product_id)
+                    first_at[pair] = min(at, first_at.get(pair, at))
+            conn.executemany("INSERT OR IGNORE INTO stock_pairs (point, product_id) VALUES (?, ?)", list(first_at))
+            for (point, product_id), at in first_at.items():
+                self._refresh_snapshots(conn, point, product_id, at)
+        return changed
+
+    def stock_quantities(self, at=None):
+        """Возвращает остатки на момент at (по умолчанию — сейчас) в виде {точка: {id товара: количество}}."""
+        balances = self._balances(self._connect(), at or datetime.now().isoformat())
+        stocks = {}
+        for (point, product_id), quantity in sorted(balances.items()):
+            stocks.setdefault(point, {})[product_id] = quantity
+        return stocks
+
+    def get_stocks(self, at=None):
+        """
+        Возвращает остатки на момент at (по умолчанию — сейчас) в виде {точка: {товар: количество}};
+        товар — основное название в справочнике.
+        """
+        names = dict(self._connect().execute("SELECT id, name FROM products").fetchall())
+        stocks = {}
+        for point, quantities in self.stock_quantities(at).items():
+            point_stocks = {names.get(product_id, str(product_id)): quantity for product_id, quantity in quantities.items()}
+            stocks[point] = dict(sorted(point_stocks.items()))
+        return stocks
+
+    def update_stock(self, point, product, operation, quantity):
+        """
+        Записывает движение add/subtract/set остатка товара в точке и возвращает новое количество.
+        Товар — название в любом написании (остаток ведётся по основному товару; новый товар заводится).
+        ValueError, если остаток стал бы отрицательным (движение тогда не записывается).
+        """
+        if operation not in STOCK_OPERATIONS:
+            raise ValueError(f"Неизвестная операция: {operation}")
+        with self.transaction() as conn:
+            now = datetime.now().isoformat()
+            product_id = self._product_id(conn, product)
+            current = self._balances(conn, now, point, product_id).get((point, product_id), 0)
+            if operation == "add":
+                new_quantity = current + quantity
+            elif operation == "subtract":
+                new_quantity = current - quantity
+            else:
+                new_quantity = quantity
+            if new_quantity < 0:
+                raise ValueError("Количество не может быть меньше 0")
+            self._append_movement(conn, now, point, product_id, operation, new_quantity - current,
+                                  quantity if operation == "set" else None)
+        return new_quantity
+
+    # Списания
+
+    def list_writeoffs(self, date_from=None, date_to=None, point=None, product_id=None,
+                       limit=WRITEOFFS_PAGE_SIZE, cursor=None):
+        """
+        Страница действующих списаний в порядке (дата, id) с названием товара
+        (или «Неизвестный товар», если товара нет в справочнике).
+        cursor — значение next_cursor предыдущей страницы: выборка продолжается по индексу
+        с места остановки, поэтому стоимость страницы не зависит от размера журнала.
+        Возвращает (списания, next_cursor); next_cursor равен None на последней странице.
+        """
+        limit = max(1, min(int(limit), WRITEOFFS_MAX_PAGE_SIZE))
+        conditions = ["t.writeoff_id IS NULL"]
+        params = []
+        if date_from:
+            conditions.append("w.date >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("w.date <= ?")
+            params.append(date_to)
+        if point:
+            conditions.append("w.point = ?")
+            params.append(point)
+        if product_id is not None:
+            conditions.append("w.product_id = ?")
+            params.append(product_id)
+        if cursor:
+            cursor_date, cursor_id = cursor.rsplit(":", 1)
+            conditions.append("(w.date > ? OR (w.date = ? AND w.id > ?))")
+            params.extend([cursor_date, cursor_date, int(cursor_id)])
+
+        rows = self._connect().execute(
+            "SELECT w.id, w.date, w.point, w.product_id, w.quantity, p.name FROM writeoffs w "
+            "LEFT JOIN writeoff_tombstones t ON t.writeoff_id = w.id "
+            "LEFT JOIN products p ON p.id = w.product_id "
+            f"WHERE {' AND '.join(conditions)} ORDER BY w.date, w.id LIMIT ?",
+            [*params, limit + 1]
+        ).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1][1]}:{rows[-1][0]}"
+        return [dict(_writeoff(row), product=row[5] or "Неизвестный товар") for row in rows], next_cursor
+
+    def _writeoff_movement(self, conn, writeoff, kind, delta):
+        """Движение остатка, соответствующее списанию (по основному товару, если id — дубликат названия)."""
+        product_id = self._canonical_product_id(conn, writeoff["product_id"])
+        if product_id is not None:
+            self._append_movement(conn, writeoff["date"] + WRITEOFF_TIME, writeoff["point"], product_id, kind, delta)
+
+    def add_writeoffs(self, writeoffs):
+        """
+        Дописывает списания в журнал одной транзакцией вместе с движениями остатков;
+        возвращает их с присвоенными id.
+        """
+        added = []
+        with self.transaction() as conn:
+            for writeoff in writeoffs:
+                cursor = conn.execute(
+                    "INSERT INTO writeoffs (date, point, product_id, quantity) VALUES (?, ?, ?, ?)",
+                    (writeoff["date"], writeoff["point"], writeoff["product_id"], writeoff["quantity"])
+                )
+                added.append(dict(writeoff, id=cursor.lastrowid))
+                self._writeoff_movement(conn, writeoff, "writeoff", -writeoff["quantity"])
+        return added
+
+    def delete_writeoff(self, writeoff_id):
+        """
+        Отмечает списание удалённым (запись-надгробие; сама строка журнала не изменяется)
+        и возвращает списанное количество в остаток.
+        Возвращает удалённую запись или None, если её нет или она уже удалена.
+        """
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT w.id, w.date, w.point, w.product_id, w.quantity FROM writeoffs w "
+                "LEFT JOIN writeoff_tombstones t ON t.writeoff_id = w.id "
+                "WHERE w.id = ? AND t.writeoff_id IS NULL",
+                (writeoff_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "INSERT INTO writeoff_tombstones (writeoff_id, deleted_at) VALUES (?, ?)",
+                (writeoff_id, datetime.now().isoformat())
+            )
+            self._writeoff_movement(conn, _writeoff(row), "writeoff_cancel", row[4])
+            tombstones = conn.execute("SELECT COUNT(*) FROM writeoff_tombstones").fetchone()[0]
+        if tombstones >= WRITEOFFS_COMPACT_THRESHOLD:
+            self.compact_writeoffs()
+        return _writeoff(row)
+
+    def compact_writeoffs(self):
+        """Уплотняет журнал: физически удаляет отмеченные списания вместе с их надгробиями."""
+        with self.transaction() as conn:
+            removed = conn.execute(
+                "DELETE FROM writeoffs WHERE id IN (SELECT writeoff_id FROM writeoff_tombstones)"
+            ).rowcount
+            conn.execute("DELETE FROM writeoff_tombstones")
+        if removed:
+            logger.info(f"Журнал списаний уплотнён: удалено {removed} записей")
+        return removed
+
+    # Сотрудники
+
+    def list_employees(self):
+        rows = self._connect().execute("SELECT id, first_name, last_name, grp, hours FROM employees ORDER BY id").fetchall()
+        return [_employee(row) for row in rows]
+
+    def save_employee(self, employee):
+        """
+        Сохраняет сотрудника: без id — добавляет с новым id, с id — обновляет существующего.
+        Возвращает сохранённую запись или None, если сотрудника с таким id нет.
+        """
+        params = (employee["firstName"], employee["lastName"], employee["group"], json_codec.dumps(employee.get("hours", {})).decode("utf-8"))
+        with self.transaction() as conn:
+            if "id" in employee:
+                cursor = conn.execute(
+                    "UPDATE employees SET first_name = ?, last_name = ?, grp = ?, hours = ? WHERE id = ?",
+                    (*params, employee["id"])
+                )
+                if not cursor.rowcount:
+                    return None
+                return dict(employee)
+            cursor = conn.execute("INSERT INTO employees (first_name, last_name, grp, hours) VALUES (?, ?, ?, ?)", params)
+            return dict(employee, id=cursor.lastrowid)
+
+    def delete_employee(self, employee_id):
+        """Удаляет сотрудника. Возвращает удалённую запись или None, если его нет."""
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT id, first_name, last_name, grp, hours FROM employees WHERE id = ?", (employee_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM employees WHERE id = ?", (employee_id,))
+        return _employee(row)
+
+    # Ставки
+
+    def list_salary_rates(self):
+        rows = self._connect().execute(
+            "SELECT grp, payment_type, hourly_rate, daily_rate FROM salary_rates ORDER BY rowid"
+        ).fetchall()
+        return [_rate(row) for row in rows]
+
+    def save_salary_rate(self, rate):
+        """Добавляет или заменяет ставку группы. Возвращает True, если группа новая."""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE salary_rates SET payment_type = ?, hourly_rate = ?, daily_rate = ? WHERE grp = ?",
+                (rate["paymentType"], rate["hourlyRate"], rate["dailyRate"], rate["group"])
+            )
+            if cursor.rowcount:
+                return False
+            conn.execute(
+                "INSERT INTO salary_rates (grp, payment_type, hourly_rate, daily_rate) VALUES (?, ?, ?, ?)",
+                (rate["group"], rate["paymentType"], rate["hourlyRate"], rate["dailyRate"])
+            )
+            return True
+
+    def delete_salary_rate(self, group):
+        """
+        Удаляет ставку группы. Возвращает удалённую запись или None, если группы нет.
+        ValueError, если группа назначена сотрудникам (проверка и удаление — в одной транзакции).
+        """
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT grp, payment_type, hourly_rate, daily_rate FROM salary_rates WHERE grp = ?", (group,)
+            ).fetchone()
+            if row is None:
+                return None
+            if conn.execute("SELECT 1 FROM employees WHERE grp = ? LIMIT 1", (group,)).fetchone():
+                raise ValueError(f"Группа {group} используется сотрудниками и не может быть удалена")
+            conn.execute("DELETE FROM salary_rates WHERE grp = ?", (group,))
+        return _rate(row)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_data_store():
+    """Общее для процесса хранилище data/app.db."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = DataStore()
+        return _default_store
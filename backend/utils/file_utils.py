@@ -1,10 +1,14 @@
 import os
-import json
 import logging
+from sbis_project.json_file import locked_json_update
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
+def _init_file(file_path, default):
+    """Создаёт файл с данными по умолчанию, не затирая файл, созданный другим процессом."""
+    locked_json_update(file_path, lambda data: default if data is None else data)
+
 def init_employees_file():
     """Инициализация файла employees.json с тестовыми данными."""
     file_path = os.path.join("data", "employees.json")
@@ -13,8 +17,7 @@ def init_employees_file():
             {"id": 1, "firstName": "Иван", "lastName": "Иванов", "group": "Повар", "hours": {}},
             {"id": 2, "firstName": "Мария", "lastName": "Петрова", "group": "Кондитер", "hours": {}}
         ]
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(default_employees, f, ensure_ascii=False)
+        _init_file(file_path, default_employees)
         logger.info("Файл employees.json инициализирован")
 
 def init_salary_rates_file():
@@ -26,16 +29,14 @@ def init_salary_rates_file():
             {"group": "Помощник повара", "paymentType": "daily", "hourlyRate": 0, "dailyRate": 800},
             {"group": "Кондитер", "paymentType": "hourly", "hourlyRate": 120, "dailyRate": 0}
         ]
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(default_rates, f, ensure_ascii=False)
+        _init_file(file_path, default_rates)
         logger.info("Файл salary_rates.json инициализирован")
 
 def init_products_file():
     """Инициализация файла products.json."""
     file_path = os.path.join("data", "products.json")
     if not os.path.exists(file_path):
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump([], f, ensure_ascii=False)
+        _init_file(file_path, [])
         logger.info("Файл products.json инициализирован")
 
 def init_stocks_file():
@@ -65,6 +66,5 @@ def init_stocks_file():
                 "сосиска в тесте": 60
             }
         }
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(stock_data, f, ensure_ascii=False)
+        _init_file(file_path, stock_data)
         logger.info("Файл stocks.json инициализирован с начальными данными")
\ No newline at end of file
@@ -0,0 +1,97 @@
+import logging
+import time
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+# Методы прогноза: линейный тренд (МНК), взвешенное скользящее среднее, сезонный наивный
+FORECAST_METHODS = ("linear", "wma", "seasonal_naive")
+DEFAULT_FORECAST_METHOD = "linear"
+
+# numpy загружается при первом прогнозе, а не при старте приложения
+_np = None
+
+
+def _numpy():
+    global _np
+    if _np is None:
+        started = time.perf_counter()
+        import numpy
+        _np = numpy
+        logger.info(f"numpy загружен за {time.perf_counter() - started:.2f} с")
+    return _np
+
+
+def stack_series(series_list):
+    """
+    Складывает ряды разной длины в одну матрицу (ряды x недели), дополняя нулями справа.
+    Возвращает (values, mask, lengths): mask отмечает фактические точки каждого ряда.
+    """
+    np = _numpy()
+    lengths = np.fromiter((len(series) for series in series_list), dtype=np.int64, count=len(series_list))
+    width = int(lengths.max()) if len(lengths) else 0
+    values = np.zeros((len(series_list), width), dtype=np.float64)
+    mask = np.arange(width) < lengths[:, None]
+    values[mask] = np.fromiter(
+        (qty for series in series_list for qty in series), dtype=np.float64, count=int(lengths.sum())
+    )
+    return values, mask, lengths
+
+
+def _linear(values, mask, lengths, horizons):
+    """Прогноз на horizons точек вперёд по прямой МНК; для рядов из одной точки — её значение."""
+    np = _numpy()
+    x = np.where(mask, np.arange(values.shape[1], dtype=np.float64), 0.0)
+    n = lengths.astype(np.float64)
+    sum_x = x.sum(axis=1)
+    sum_y = values.sum(axis=1)
+    sum_xx = (x * x).sum(axis=1)
+    sum_xy = (x * values).sum(axis=1)
+
+    denominator = n * sum_xx - sum_x * sum_x
+    has_trend = denominator != 0
+    slope = np.divide(n * sum_xy - sum_x * sum_y, denominator, out=np.zeros_like(n), where=has_trend)
+    mean = np.divide(sum_y, n, out=np.zeros_like(n), where=n > 0)
+    intercept = np.where(has_trend, mean - slope * np.divide(sum_x, n, out=np.zeros_like(n), where=n > 0), mean)
+    return np.where(has_trend, intercept + slope * (n - 1 + horizons), mean)
+
+
+def _weighted_moving_average(values, mask, lengths, horizons):
+    """Среднее с весами 1..n: последняя неделя весит больше всего. Прогноз одинаков для любого горизонта."""
+    np = _numpy()
+    weights = np.where(mask, np.arange(1, values.shape[1] + 1, dtype=np.float64), 0.0)
+    total_weight = weights.sum(axis=1)
+    return np.divide((weights * values).sum(axis=1), total_weight, out=np.zeros(len(values)), where=total_weight > 0)
+
+
+def _seasonal_naive(values, mask, lengths, horizons):
+    """Прогноз равен значению за ту же позицию прошлой недели (последняя точка ряда) на любом горизонте."""
+    np = _numpy()
+    last = np.maximum(lengths - 1, 0)
+    result = values[np.arange(len(values)), last] if values.shape[1] else np.zeros(len(values))
+    return np.where(lengths > 0, result, 0.0)
+
+
+_METHODS = {
+    "linear": _linear,
+    "wma": _weighted_moving_average,
+    "seasonal_naive": _seasonal_naive
+}
+
+
+def forecast_series(series_list, method=DEFAULT_FORECAST_METHOD, horizons=None):
+    """
+    Прогнозирует точку через horizons[i] шагов (по умолчанию следующую) для каждого ряда
+    продаж за один векторный проход.
+    Возвращает список неотрицательных целых прогнозов в порядке series_list.
+    """
+    if method not in _METHODS:
+        raise ValueError(f"Неизвестный метод прогноза: {method}")
+    if not series_list:
+        return []
+    np = _numpy()
+    values, mask, lengths = stack_series(series_list)
+    horizons = np.ones(len(series_list)) if horizons is None else np.asarray(horizons, dtype=np.float64)
+    forecast = np.maximum(0, np.round(_METHODS[method](values, mask, lengths, horizons)))
+    logger.info(f"Прогноз ({method}) рассчитан для {len(series_list)} рядов, до {values.shape[1]} точек в ряду")
+    return [int(value) for value in forecast]
@@ -1,38 +1,90 @@
-import os
-import json
 import logging
+import threading
+from utils.data_store import get_data_store, normalize_product_name
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
 
-def update_products_from_data(data):
-    """Обновляет список товаров в products.json на основе данных из чеков."""
-    file_path = os.path.join("data", "products.json")
-    try:
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                products = json.load(f)
-        else:
-            products = []
-
-        product_names = set()
-        for point in data:
-            for item in point['items']:
-                product_names.add(item['name'])
-
-        existing_names = {product["name"] for product in products}
-        max_id = max([p["id"] for p in products], default=0) if products else 0
-
-        new_products = []
-        for name in product_names:
-            if name not in existing_names:
-                max_id += 1
-                new_products.append({"id": max_id, "name": name})
-
-        if new_products:
-            products.extend(new_products)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(products, f, ensure_ascii=False)
-            logger.info(f"Добавлено {len(new_products)} новых товаров в products.json")
-    except Exception as e:
-        logger.error(f"Ошибка при обновлении списка товаров: {str(e)}")
\ No newline at end of file
+
+class ProductCatalog:
+    """
+    Справочник товаров с индексами в памяти процесса: нормализованное название -> id и id -> название.
+    Сырые названия из чеков приводятся к нормализованному виду, поэтому варианты написания
+    одного товара получают один id; таблица псевдонимов в хранилище хранит эту привязку.
+    Индекс перезагружается из хранилища, когда меняется версия "products" (товары и псевдонимы,
+    заведённые этим или другим процессом). Товары заводятся при загрузке чеков
+    (resolve — обработчик SBISApp.set_product_resolver) и при вводе остатка нового товара
+    (DataStore.update_stock): в хранилище дописываются лишь новые товары (под блокировкой),
+    а первичный ключ псевдонима не даёт разным процессам завести один товар дважды.
+    При формировании ответов справочник только читается (get_id, name).
+    """
+
+    def __init__(self, data_store):
+        self.data_store = data_store
+        self._lock = threading.Lock()
+        self._ids = None
+        self._names = None
+        self._version = None
+
+    def _index(self):
+        # Версия читается до загрузки: загруженный индекс не старше неё
+        version = self.data_store.version("products")
+        if self._ids is None or version != self._version:
+            self._version = version
+            self._names = {product["id"]: product["name"] for product in self.data_store.list_products()}
+            self._ids = self.data_store.product_aliases()
+            logger.info(f"Справочник товаров загружен: {len(self._names)} шт., {len(self._ids)} вариантов названий")
+        return self._ids
+
+    def get_id(self, name):
+        """id товара по названию в любом написании; None, если товара нет в справочнике."""
+        alias = normalize_product_name(name)
+        with self._lock:
+            return self._index().get(alias)
+
+    def name(self, product_id):
+        """Основное название товара по id."""
+        with self._lock:
+            self._index()
+            return self._names.get(product_id)
+
+    def resolve(self, names):
+        """Возвращает {название: id} для всех names, заводя отсутствующие товары."""
+        names = set(names)
+        aliases = {name: normalize_product_name(name) for name in names}
+        with self._lock:
+            index = self._index()
+            added = self._add(index, names, aliases)
+            product_ids = {name: index[alias] for name, alias in aliases.items()}
+        if added:
+            logger.info(f"Добавлено {len(added)} новых товаров в справочник")
+        return product_ids
+
+    def _add(self, index, names, aliases):
+        # Основным названием нового товара становится первый по алфавиту вариант без лишних пробелов
+        new_products = {}
+        for name in sorted(names):
+            if aliases[name] not in index:
+                new_products.setdefault(aliases[name], " ".join(name.split()))
+        if not new_products:
+            return []
+        # Товары, которые успел завести другой процесс, возвращаются с его id
+        ids, added = self.data_store.add_products((name, alias) for alias, name in new_products.items())
+        index.update(ids)
+        self._names.update((product["id"], product["name"]) for product in added)
+        for product_id in set(ids.values()) - self._names.keys():
+            self._names[product_id] = self.data_store.get_product(product_id)["name"]
+        return added
+
+
+_default_catalog = None
+_default_catalog_lock = threading.Lock()
+
+
+def get_product_catalog():
+    """Общий для процесса справочник товаров поверх get_data_store()."""
+    global _default_catalog
+    with _default_catalog_lock:
+        if _default_catalog is None:
+            _default_catalog = ProductCatalog(get_data_store())
+        return _default_catalog
@@ -0,0 +1,11 @@
+from flask import current_app
+from sbis_project import json_codec
+
+
+def json_response(data):
+    """
+    Ответ API в JSON через быстрый кодек (вместо flask.jsonify).
+    data — объект или уже закодированный JSON (bytes): он отдаётся как есть, без повторного кодирования.
+    """
+    body = data if isinstance(data, bytes) else json_codec.dumps(data)
+    return current_app.response_class(body, mimetype='application/json')
@@ -0,0 +1,114 @@
+ALL_POINTS_NAME = "Все точки"
+
+# Длина префикса receiveDateTime ("YYYY-MM-DDTHH:MM:SS") для группировки по дню/часу
+BUCKET_PREFIX_LENGTH = {"day": 10, "hour": 13}
+
+
+def _point_summary(point_name, products, names):
+    items = sorted(
+        ({"name": names.get(product, product), "quantity": totals[0], "total_sum": totals[1]}
+         for product, totals in products.items()),
+        key=lambda item: item["name"]
+    )
+    return {
+        "point_name": point_name,
+        "items": items,
+        "total_sum": sum(item["total_sum"] for item in items)
+    }
+
+
+def _summarize(rows, names, bucket):
+    """
+    Сворачивает строки (точка, товар, количество, сумма, ключ дня/часа) в сводку продаж.
+    Товар — название или id; names переводит id в название для ответа.
+    """
+    by_point = {}
+    all_points = {}
+    by_bucket = {}
+
+    for point_name, product, quantity, total_sum, bucket_key in rows:
+        products = by_point.setdefault(point_name, {})
+        for totals in (products.setdefault(product, [0, 0]), all_points.setdefault(product, [0, 0])):
+            totals[0] += quantity
+            totals[1] += total_sum
+        if bucket:
+            totals = by_bucket.setdefault((bucket_key, point_name, product), [0, 0])
+            totals[0] += quantity
+            totals[1] += total_sum
+
+    summary = {
+        "data": [_point_summary(point_name, products, names) for point_name, products in by_point.items()],
+        "all_points": _point_summary(ALL_POINTS_NAME, all_points, names)
+    }
+    if bucket:
+        summary["buckets"] = sorted(
+            (
+                {
+                    "bucket": bucket_key.replace("T", " ") + (":00" if bucket == "hour" else ""),
+                    "point_name": point_name,
+                    "name": names.get(product, product),
+                    "quantity": totals[0],
+                    "total_sum": totals[1]
+                }
+                for (bucket_key, point_name, product), totals in by_bucket.items()
+            ),
+            key=lambda row: (row["bucket"], row["point_name"], row["name"])
+        )
+    return summary
+
+
+class _ProductNames:
+    """
+    Ключи товаров для свёртки: id, назначенный при загрузке чеков, или название, если id нет.
+    Для каждого id запоминает название для ответа — основное из справочника (только чтение),
+    без справочника — первое встретившееся.
+    """
+
+    def __init__(self, product_catalog):
+        self.product_catalog = product_catalog
+        self.names = {}
+
+    def key(self, product_id, name):
+        if product_id is None:
+            return name
+        if product_id not in self.names:
+            catalog_name = self.product_catalog.name(product_id) if self.product_catalog is not None else None
+            self.names[product_id] = catalog_name or name
+        return product_id
+
+
+def summarize_sales(receipts, bucket=None, product_catalog=None):
+    """
+    Сворачивает результат SBISApp.get_receipts в итоги по точке и товару.
+    Возвращает {"data": [итоги по точкам], "all_points": итог по всем точкам};
+    при bucket ("day" или "hour") добавляет "buckets" — итоги по точке, товару и дню/часу.
+    Варианты написания одного товара (один product_id) сводятся в одну строку;
+    product_catalog даёт им основное название.
+    """
+    prefix_length = BUCKET_PREFIX_LENGTH.get(bucket)
+    products = _ProductNames(product_catalog)
+    rows = (
+        (
+            point["point_name"],
+            products.key(item.product_id, item.name),
+            item.quantity,
+            item.total_sum,
+            item.receive_dt[:prefix_length] if prefix_length else None
+        )
+        for point in receipts
+        for item in point["items"]
+    )
+    return _summarize(rows, products.names, bucket if prefix_length else None)
+
+
+def summarize_rollups(rollups, bucket=None, product_catalog=None):
+    """
+    То же, что summarize_sales, но по итогам SBISApp.get_daily_rollup.
+    Итоги хранятся по дням, поэтому поддерживается только bucket="day".
+    """
+    products = _ProductNames(product_catalog)
+    rows = (
+        (row["point_name"], products.key(row["product_id"], row["name"]), row["quantity"], row["total_sum"], row["day"])
+        for row in rollups
+    )
+    return _summarize(rows, products.names, "day" if bucket == "day" else None)
@@ -0,0 +1,39 @@
+import logging
+from utils.data_store import SALE_REF
+
+# Настройка логирования
+logger = logging.getLogger(__name__)
+
+
+class StockSalesRecorder:
+    """
+    Списывает продажи из чеков с остатков: обработчик SBISApp.add_ingest_listener.
+    Продажи каждого сохранённого шарда (день, ККТ) записываются в журнал остатков движениями
+    "sale" на время своих чеков и заменяют прежние продажи этого шарда, поэтому дозагрузки
+    и повторные загрузки не списывают одно и то же дважды. Шарды одной синхронизации
+    записываются одной транзакцией.
+    Списываются только товары, остатки которых в точке уже ведутся; позиции сопоставляются
+    с ними по id товара, назначенному при загрузке чеков (позиции без id не списываются).
+    """
+
+    def __init__(self, data_store, receipt_store):
+        self.data_store = data_store
+        self.receipt_store = receipt_store
+
+    def __call__(self, shards):
+        tracked_by_point = {}
+        sales_by_ref = {}
+        for day, reg_id, point_name in shards:
+            if point_name not in tracked_by_point:
+                tracked_by_point[point_name] = set(self.data_store.stock_product_ids(point_name))
+            tracked = tracked_by_point[point_name]
+            sales = [
+                (at, product_id, quantity)
+                for at, product_id, _, quantity in self.receipt_store.sales_by_time(day, reg_id)
+                if product_id in tracked
+            ]
+            sales_by_ref[SALE_REF.format(day=day, reg_id=reg_id)] = (point_name, sales)
+
+        changed = self.data_store.replace_sales(sales_by_ref)
+        if changed:
+            logger.info(f"Продажи списаны с остатков: обновлено {changed} из {len(shards)} шардов")
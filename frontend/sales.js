@@ -221,68 +221,26 @@ document.addEventListener("DOMContentLoaded", async function () {
         let allData = [];
 
         try {
-            if (daysDiff <= 0) {
-                console.log("Период слишком короткий, делаем один запрос");
-                const params = new URLSearchParams({
-                    date_from: dateFrom,
-                    date_to: dateTo
-                });
-                if (pointName) {
-                    params.append("point_name", pointName);
-                }
-
-                const response = await window.common.axiosWithRetry(() => window.common.axiosInstance.get(`http://localhost:5000/api/receipts?${params.toString()}`, {
-                    headers: { "X-SBISSessionID": sid }
-                }));
-
-                if (response.data.data) {
-                    allData = response.data.data;
-                }
-            } else {
-                // Создаём массив дат для последовательных запросов (по 1 дню)
-                const dateRanges = [];
-                let currentFrom = dateFrom;
-                while (new Date(currentFrom) < new Date(dateTo)) {
-                    let currentTo = common.addOneDay(currentFrom);
-                    dateRanges.push({ date_from: currentFrom, date_to: currentTo });
-                    currentFrom = currentTo;
-                }
-
-                // Выполняем запросы последовательно
-                for (const { date_from, date_to } of dateRanges) {
-                    console.log(`Запрос: date_from=${date_from}, date_to=${date_to}`);
-                    const params = new URLSearchParams({
-                        date_from,
-                        date_to
-                    });
-                    if (pointName) {
-                        params.append("point_name", pointName);
-                    }
-
-                    const response = await window.common.axiosWithRetry(() => window.common.axiosInstance.get(`http://localhost:5000/api/receipts?${params.toString()}`, {
-                        headers: { "X-SBISSessionID": sid }
-                    }));
-
-                    if (response.data.data) {
-                        allData = allData.concat(response.data.data);
-                    } else {
-                        console.log(`Нет данных за ${date_from} - ${date_to}`);
-                    }
-                }
-
-                console.log(`Всего получено точек: ${allData.length}`);
+            // Один запрос: сервер сам агрегирует продажи по точкам и товарам за весь период
+            const params = new URLSearchParams({
+                date_from: dateFrom,
+                date_to: dateTo
+            });
+            if (pointName) {
+                params.append("point_name", pointName);
             }
 
-            console.log("Все данные получены:", allData);
+            const response = await window.common.axiosWithRetry(() => window.common.axiosInstance.get(`http://localhost:5000/api/sales/summary?${params.toString()}`, {
+                headers: { "X-SBISSessionID": sid }
+            }));
+            console.log("Сводка продаж получена:", response.data);
 
-            // Если выбрана конкретная точка, агрегируем данные для неё
             if (pointName) {
-                allData = [aggregateSinglePoint(allData)];
-            } else {
-                // Если выбраны "Все точки", агрегируем данные
-                const aggregatedData = common.aggregateAllPoints(allData);
-                console.log("Агрегированные данные для всех точек:", aggregatedData);
-                allData = [aggregatedData];
+                // Для конкретной точки сервер возвращает одну запись
+                allData = (response.data.data || []).filter(point => point.items.length > 0);
+            } else if (response.data.all_points && response.data.all_points.items.length > 0) {
+                // Для "Все точки" используем итог по всем точкам
+                allData = [response.data.all_points];
             }
 
             // Сохраняем данные для экспорта
@@ -70,17 +70,10 @@ document.addEventListener("DOMContentLoaded", async function () {
         });
     }
 
-    // Функция для получения и фильтрации списаний
+    // Функция для получения списаний; фильтры по дате и точке применяются на сервере
     async function fetchAndFilterWriteoffs(applyFilters = false) {
         try {
-            const response = await window.common.axiosWithRetry(() => window.common.axiosInstance.get("http://localhost:5000/api/writeoffs"));
-            let writeoffs = response.data.writeoffs || [];
-
-            if (writeoffs.length === 0) {
-                return [];
-            }
-
-            // Применяем фильтры, если требуется
+            const params = new URLSearchParams();
             if (applyFilters) {
                 const dateRange = document.getElementById("writeoffFilterDateRange").value;
                 const pointFilter = document.getElementById("writeoffFilterPoint").value;
@@ -88,28 +81,26 @@ document.addEventListener("DOMContentLoaded", async function () {
                 // Фильтрация по дате
                 if (dateRange) {
                     const [dateFrom, dateTo] = dateRange.split(" to ");
-                    if (dateFrom && dateTo) {
-                        writeoffs = writeoffs.filter(writeoff => {
-                            const writeoffDate = new Date(writeoff.date);
-                            const from = new Date(dateFrom);
-                            const to = new Date(dateTo);
-                            return writeoffDate >= from && writeoffDate <= to;
-                        });
-                    } else if (dateFrom) {
-                        writeoffs = writeoffs.filter(writeoff => {
-                            const writeoffDate = new Date(writeoff.date);
-                            const from = new Date(dateFrom);
-                            return writeoffDate >= from;
-                        });
-                    }
+                    if (dateFrom) params.append("date_from", dateFrom);
+                    if (dateTo) params.append("date_to", dateTo);
                 }
 
                 // Фильтрация по точке продаж
                 if (pointFilter) {
-                    writeoffs = writeoffs.filter(writeoff => writeoff.point === pointFilter);
+                    params.append("point", pointFilter);
                 }
             }
 
+            // Загружаем все страницы, переходя по next_cursor
+            const writeoffs = [];
+            let cursor = null;
+            do {
+                if (cursor) params.set("cursor", cursor);
+                const response = await window.common.axiosWithRetry(() => window.common.axiosInstance.get(`http://localhost:5000/api/writeoffs?${params.toString()}`));
+                writeoffs.push(...(response.data.writeoffs || []));
+                cursor = response.data.next_cursor;
+            } while (cursor);
+
             return writeoffs;
         } catch (error) {
             console.error("Ошибка при загрузке списаний:", error);